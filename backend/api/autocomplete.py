@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.db.models import QuerySet
+
+from recipes.reference import cached_ingredients
+
+
+def autocomplete(queryset, name, limit=None):
+    limit = limit or settings.INGREDIENTS_AUTOCOMPLETE_LIMIT
+    if not isinstance(queryset, QuerySet):
+        return cached_ingredients.search(name, limit) or []
+    found = list(queryset.filter(name__istartswith=name)[:limit])
+    if len(found) < limit:
+        found += queryset.filter(name__icontains=name).exclude(
+            name__istartswith=name
+        )[:limit - len(found)]
+    return found
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from hashlib import md5
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from recipes.versions import user_version
+
+
+@contextmanager
+def anonymous(request):
+    user, auth = request.user, request.auth
+    request.user, request.auth = AnonymousUser(), None
+    try:
+        yield
+    finally:
+        request.user, request.auth = user, auth
+
+
+class ConditionalResponseMixin:
+    versions = ()
+    per_user = False
+    cache_shared = False
+    per_user_params = ()
+    cached_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    def get_user_id(self, request):
+        if self.per_user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+    @staticmethod
+    def make_etag(request, user_id, versions):
+        return quote_etag(md5('|'.join(map(str, (
+            request.build_absolute_uri(),
+            request.META.get('HTTP_ACCEPT', ''),
+            user_id,
+            *versions
+        ))).encode()).hexdigest())
+
+    def conditional(self, handler, request, *args, **kwargs):
+        shared = [version.get() for version in self.versions]
+        user_id = self.get_user_id(request)
+        versions = shared
+        if user_id is not None:
+            versions = shared + [user_version(user_id).get()]
+        if None in versions:
+            return handler(request, *args, **kwargs)
+        etag = self.make_etag(request, user_id, versions)
+        last_modified = int(max(float(version) for version in versions))
+        response = get_conditional_response(request, etag, last_modified)
+        if response is None:
+            response = self.cached(self.make_etag(request, None, shared),
+                                   handler, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            if user_id is None:
+                patch_cache_control(response, public=True, no_cache=True)
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def cached(self, etag, handler, request, *args, **kwargs):
+        if (not self.cache_shared
+                or self.action not in self.cached_actions
+                or any(request.query_params.get(param)
+                       for param in self.per_user_params)):
+            return handler(request, *args, **kwargs)
+        key = f'response:{etag}'
+        data = caches['responses'].get(key)
+        if data is None:
+            with anonymous(request):
+                response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            caches['responses'].set(key, data)
+        if self.get_user_id(request) is not None:
+            data = self.overlay(request, data)
+        return Response(data)
+
+    def overlay(self, request, data):
+        return data
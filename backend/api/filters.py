@@ -1,30 +1,89 @@
+from django.db.models import Exists, OuterRef, QuerySet
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
+from .autocomplete import autocomplete
+from recipes.models import Recipe, Tag
+from recipes.reference import cached_ingredients, cached_tags
+from recipes.search import search
+
+
+ORDERINGS = {
+    'popular': ('-score__popular', '-id'),
+    'trending': ('-score__trending', '-id'),
+    'quickest': ('cooking_time', '-id'),
+}
+
+
+def tag_choices():
+    tags = cached_tags.all()
+    if tags is None:
+        tags = Tag.objects.all()
+    return [(tag.slug, tag.name) for tag in tags]
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(choices=tag_choices,
+                                        method='filter_tags')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        )
+        tags = cached_tags.all()
+        if tags is None:
+            recipe_tags = recipe_tags.filter(tag__slug__in=value)
+        else:
+            recipe_tags = recipe_tags.filter(tag_id__in=[
+                tag.id for tag in tags if tag.slug in value
+            ])
+        return queryset.filter(Exists(recipe_tags))
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        return search(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value in ('popular', 'trending'):
+            queryset = queryset.filter(score__isnull=False)
+        return queryset.order_by(*ORDERINGS[value])
+
 
 class IngredientSearchFilter(SearchFilter):
     search_param = 'name'
+    autocomplete_param = 'autocomplete'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param)
+        if name and request.query_params.get(self.autocomplete_param):
+            return autocomplete(queryset, name)
+        if isinstance(queryset, QuerySet):
+            return super().filter_queryset(request, queryset, view)
+        if not name:
+            return queryset
+        return cached_ingredients.search(name, substrings=False) or []
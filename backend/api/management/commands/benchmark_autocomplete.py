@@ -0,0 +1,43 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from api.autocomplete import autocomplete
+from recipes.models import Ingredient
+from recipes.reference import cached_ingredients
+
+
+class Command(BaseCommand):
+    help = 'Measures ingredient autocomplete latency per keystroke'
+
+    def add_arguments(self, parser):
+        parser.add_argument('word', nargs='?', default='картофель')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def measure(self, search, repeat):
+        started = perf_counter()
+        for _ in range(repeat):
+            found = search()
+        return (perf_counter() - started) / repeat * 1000, len(found)
+
+    def handle(self, *args, **options):
+        word, repeat = options['word'], options['repeat']
+        queryset = Ingredient.objects.all()
+        cached = cached_ingredients.all()
+        searches = (
+            ('search', lambda prefix: list(
+                queryset.filter(name__istartswith=prefix)
+            )),
+            ('db', lambda prefix: autocomplete(queryset, prefix)),
+            ('cache', lambda prefix: autocomplete(cached, prefix)),
+        )
+        self.stdout.write(f'{"query":<20}' + ''.join(
+            f'{title + ", ms":>12}{"rows":>6}' for title, _ in searches
+        ))
+        for length in range(1, len(word) + 1):
+            prefix = word[:length]
+            line = f'{prefix:<20}'
+            for _, search in searches:
+                elapsed, rows = self.measure(lambda: search(prefix), repeat)
+                line += f'{elapsed:>12.3f}{rows:>6}'
+            self.stdout.write(line)
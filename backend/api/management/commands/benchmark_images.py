@@ -0,0 +1,50 @@
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.management.seed import request_factory
+from api.serializers import FastRecipeSerializer
+from recipes.models import Recipe
+
+
+class Base64RecipeSerializer(FastRecipeSerializer):
+    image_field = Base64ImageField(represent_in_base64=True)
+
+    def to_representation(self, recipe):
+        data = super().to_representation(recipe)
+        del data['image_renditions']
+        data['image'] = self.image_field.to_representation(recipe.image)
+        return data
+
+
+class Command(BaseCommand):
+    help = 'Compares image representations for a page of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        recipes = list(Recipe.objects.with_user_data(AnonymousUser())[
+            :options['page_size']
+        ])
+        modes = (
+            ('base64', Base64RecipeSerializer, ''),
+            ('url', FastRecipeSerializer, ''),
+            ('inline_thumb', FastRecipeSerializer, '?image=inline_thumb'),
+        )
+        self.stdout.write(f'{len(recipes)} recipes per page')
+        self.stdout.write(f'{"mode":<15}{"bytes":>12}{"ms":>10}')
+        for title, serializer_class, query in modes:
+            request = Request(request_factory().get(f'/api/recipes/{query}'))
+            started = perf_counter()
+            for _ in range(options['repeat']):
+                content = JSONRenderer().render(serializer_class(
+                    recipes, many=True, context={'request': request}
+                ).data)
+            elapsed = (perf_counter() - started) / options['repeat'] * 1000
+            self.stdout.write(f'{title:<15}{len(content):>12}{elapsed:>10.2f}')
@@ -0,0 +1,67 @@
+from io import BytesIO
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.management.seed import request_factory, rolled_back, seed
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.serializers import FastRecipeSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Times JSON rendering and parsing of a list of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Synthetic recipes to add before measuring'
+        )
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if options['seed']:
+                seed(options['seed'], log=self.stdout.write)
+            self.measure(options['recipes'], options['repeat'])
+
+    def measure(self, count, repeat):
+        request = Request(request_factory().get('/api/recipes/'))
+        data = FastRecipeSerializer(
+            Recipe.objects.with_user_data(AnonymousUser())[:count],
+            many=True,
+            context={'request': request}
+        ).data
+        self.stdout.write(f'{len(data)} recipes, {repeat} runs')
+        self.stdout.write(f'{"backend":<10}{"bytes":>12}'
+                          f'{"render ms":>12}{"parse ms":>12}')
+        outputs = []
+        for title, renderer, parser in (
+            ('json', JSONRenderer(), JSONParser()),
+            ('orjson', ORJSONRenderer(), ORJSONParser()),
+        ):
+            started = perf_counter()
+            for _ in range(repeat):
+                content = renderer.render(data)
+            rendered = perf_counter() - started
+            started = perf_counter()
+            for _ in range(repeat):
+                parser.parse(BytesIO(content))
+            parsed = perf_counter() - started
+            outputs.append(content)
+            self.stdout.write(
+                f'{title:<10}{len(content):>12}'
+                f'{rendered / repeat * 1000:>12.2f}'
+                f'{parsed / repeat * 1000:>12.2f}'
+            )
+        if outputs[0] != outputs[1]:
+            raise CommandError('Renderers produced different output')
+        self.stdout.write('Output is byte-identical')
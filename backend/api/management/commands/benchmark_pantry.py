@@ -0,0 +1,64 @@
+import random
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count
+
+from api.management.seed import rolled_back, seed
+from recipes.models import Ingredient, Recipe
+from recipes.pantry import PantrySnapshot, sql_matches
+
+
+class Command(BaseCommand):
+    help = 'Compares the in-memory pantry index with the SQL join'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Synthetic recipes to add before measuring'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--pantry', type=int, default=10)
+        parser.add_argument('--missing', type=int, default=2)
+        parser.add_argument('--page-size', type=int, default=6)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if options['seed']:
+                seed(options['seed'], log=self.stdout.write)
+            self.measure(options)
+
+    def measure(self, options):
+        started = perf_counter()
+        snapshot = PantrySnapshot.read()
+        self.stdout.write(
+            f'{Recipe.objects.count()} recipes indexed in '
+            f'{perf_counter() - started:.2f} s'
+        )
+        ingredient_ids = list(Ingredient.objects.annotate(
+            uses=Count('ingredientinrecipe')
+        ).filter(uses__gt=0).order_by('-uses').values_list('id', flat=True))
+        rng = random.Random(options['pantry'])
+        pantries = [
+            rng.sample(ingredient_ids,
+                       min(options['pantry'], len(ingredient_ids)))
+            for _ in range(options['repeat'])
+        ]
+        page = slice(0, options['page_size'])
+        for title, match in (('index', snapshot.match),
+                             ('sql', sql_matches)):
+            found = []
+            started = perf_counter()
+            for pantry in pantries:
+                matches = match(pantry, options['missing'])
+                found.append((len(matches), list(matches[page])))
+            elapsed = (perf_counter() - started) / options['repeat'] * 1000
+            self.stdout.write(f'{title:<8}{elapsed:>10.2f} ms'
+                              f'{found[0][0]:>8} recipes')
+            if title == 'index':
+                expected = found
+            elif found != expected:
+                raise CommandError('Index and SQL results differ')
+        self.stdout.write('Results are identical')
@@ -0,0 +1,80 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django_filters.rest_framework import filters
+from rest_framework.test import force_authenticate
+
+from api.filters import RecipeFilter
+from api.management.seed import request_factory, rolled_back, seed
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Recipe, Tag
+from users.models import User
+
+
+class JoinRecipeFilter(RecipeFilter):
+    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+
+
+class JoinRecipeViewSet(RecipeViewSet):
+    filterset_class = JoinRecipeFilter
+
+
+class Command(BaseCommand):
+    help = 'Times /api/recipes/?tags=a&tags=b&is_favorited=1'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Synthetic recipes to add before measuring'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the synthetic data instead of rolling it back'
+        )
+
+    def handle(self, *args, **options):
+        with rolled_back(not options['keep']):
+            if options['seed']:
+                seed(options['seed'], log=self.stdout.write)
+            self.measure(options['repeat'])
+
+    def measure(self, repeat):
+        user_id = Favorite.objects.values('user_id').annotate(
+            favorites=Count('id')
+        ).order_by('-favorites')[0]['user_id']
+        user = User.objects.get(pk=user_id)
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+        url = '/api/recipes/?' + '&'.join(
+            f'tags={slug}' for slug in slugs
+        ) + '&is_favorited=1'
+        self.stdout.write(
+            f'{Recipe.objects.count()} recipes, GET {url} as {user}'
+        )
+        for title, viewset in (('join', JoinRecipeViewSet),
+                               ('exists', RecipeViewSet)):
+            view = viewset.as_view({'get': 'list'})
+            request = request_factory().get(url)
+            force_authenticate(request, user)
+            started = perf_counter()
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    response = view(request)
+            elapsed = (perf_counter() - started) / repeat * 1000
+            self.stdout.write(
+                f'{title:<8}{elapsed:>10.2f} ms{len(queries):>4} queries'
+                f'{response.data.get("count", "-"):>8} recipes'
+                f'{response.status_code:>5}'
+            )
+        filterset = RecipeFilter(
+            {'tags': slugs, 'is_favorited': '1'},
+            Recipe.objects.with_user_data(user),
+            request=request
+        )
+        self.stdout.write(filterset.qs.explain())
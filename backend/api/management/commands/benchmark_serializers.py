@@ -0,0 +1,109 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.db.models import BooleanField, Prefetch, Value
+from rest_framework import serializers
+from rest_framework.request import Request
+
+from api.management.seed import request_factory, rolled_back, seed
+from api.renderers import ORJSONRenderer
+from api.serializers import (CustomUserSerializer, FastFollowSerializer,
+                             FastRecipeSerializer, FollowSerializer,
+                             RecipeImageField, RecipeImageRenditionsField,
+                             TagSerializer)
+from recipes.models import Recipe
+from users.models import User
+
+
+class ModelRecipeSerializer(serializers.ModelSerializer):
+    tags = TagSerializer(many=True)
+    author = CustomUserSerializer(read_only=True)
+    ingredients = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    image = RecipeImageField(rendition=settings.RECIPE_IMAGE_RENDITION)
+    image_renditions = RecipeImageRenditionsField()
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'tags', 'author', 'ingredients',
+                  'is_favorited', 'is_in_shopping_cart',
+                  'name', 'image', 'image_renditions', 'text',
+                  'cooking_time')
+
+    def get_ingredients(self, obj):
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in obj.ingredient_list.all()
+        ]
+
+    def get_is_favorited(self, obj):
+        return obj.is_favorited
+
+    def get_is_in_shopping_cart(self, obj):
+        return obj.is_in_shopping_cart
+
+
+class Command(BaseCommand):
+    help = 'Compares ModelSerializer and lightweight read serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Synthetic recipes to add before measuring'
+        )
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if options['seed']:
+                seed(options['seed'], log=self.stdout.write)
+            self.measure(options)
+
+    def measure(self, options):
+        request = Request(request_factory().get('/api/recipes/'))
+        recipes = list(Recipe.objects.with_user_data(AnonymousUser())[
+            :options['recipes']
+        ])
+        authors = list(User.objects.filter(
+            recipes__isnull=False
+        ).distinct().annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(
+            Prefetch('recipes', to_attr='limited_recipes')
+        )[:options['recipes']])
+        self.stdout.write(f'{len(recipes)} recipes, {len(authors)} authors, '
+                          f'{options["repeat"]} runs')
+        self.stdout.write(f'{"serializer":<28}{"ms":>10}{"pages/s":>10}')
+        for objects, pair in (
+            (recipes, (ModelRecipeSerializer, FastRecipeSerializer)),
+            (authors, (FollowSerializer, FastFollowSerializer)),
+        ):
+            outputs = []
+            for serializer_class in pair:
+                started = perf_counter()
+                for _ in range(options['repeat']):
+                    content = ORJSONRenderer().render(serializer_class(
+                        objects, many=True, context={'request': request}
+                    ).data)
+                elapsed = (perf_counter() - started) / options['repeat']
+                pages = len(objects) / options['page_size'] / elapsed
+                outputs.append(content)
+                self.stdout.write(f'{serializer_class.__name__:<28}'
+                                  f'{elapsed * 1000:>10.2f}{pages:>10.0f}')
+            if outputs[0] != outputs[1]:
+                raise CommandError(
+                    f'{pair[1].__name__} output differs'
+                )
+        self.stdout.write('Output is byte-identical')
@@ -0,0 +1,114 @@
+import re
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from api.filters import RecipeFilter
+from api.management.seed import rolled_back, seed
+from recipes.models import (Favorite, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingList, Tag)
+from users.models import Follow, User
+
+FULL_SCANS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(
+        r'\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?\s*$'
+        r'|\bSEARCH (?:TABLE )?(\w+) .*\(ANY\(',
+        re.MULTILINE
+    ),
+}
+
+
+def hot_queries(user, recipe, author):
+    recipes = Recipe.objects.with_user_data(user)
+    slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+    return (
+        ('recipe list', recipes[:6]),
+        ('recipes by author', RecipeFilter(
+            {'author': author.pk}, recipes
+        ).qs[:6]),
+        ('recipes by tags', RecipeFilter({'tags': slugs}, recipes).qs[:6]),
+        ('favorited recipes', RecipeFilter(
+            {'is_favorited': '1'}, recipes
+        ).qs[:6]),
+        ('recipes in shopping cart', RecipeFilter(
+            {'is_in_shopping_cart': '1'}, recipes
+        ).qs[:6]),
+        ('popular recipes', RecipeFilter(
+            {'ordering': 'popular'}, recipes
+        ).qs[:6]),
+        ('trending recipes', RecipeFilter(
+            {'ordering': 'trending'}, recipes
+        ).qs[:6]),
+        ('quickest recipes', RecipeFilter(
+            {'ordering': 'quickest'}, recipes
+        ).qs[:6]),
+        ('recipe ingredients', IngredientInRecipe.objects.filter(
+            recipe=recipe
+        ).select_related('ingredient')),
+        ('favorites of recipe', Favorite.objects.filter(
+            recipe=recipe
+        ).order_by()),
+        ('shopping carts of recipe', ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values('user').order_by()),
+        ('shopping list', ShoppingList.objects.filter(
+            user=user
+        ).order_by()),
+        ('subscriptions', User.objects.filter(
+            following__user=user
+        ).order_by(*User._meta.ordering, 'id')[:6]),
+        ('followers of author', Follow.objects.filter(
+            author=author
+        ).order_by()),
+        ('latest recipes of author', Recipe.objects.filter(
+            author=author
+        ).order_by('-pub_date')[:3]),
+    )
+
+
+class Command(BaseCommand):
+    help = ('Fails when a hot query reads a whole table '
+            'instead of using an index')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Synthetic recipes to add before checking'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCANS:
+            raise CommandError(f'{connection.vendor} is not supported')
+        with rolled_back():
+            if options['seed']:
+                seed(options['seed'], log=self.stdout.write)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            failed = self.check_plans(options['verbosity'])
+        if failed:
+            raise CommandError(f'Full scans in: {", ".join(failed)}')
+        self.stdout.write('All query plans use indexes')
+
+    def check_plans(self, verbosity):
+        favorite = Favorite.objects.order_by('-recipe_id').first()
+        follow = Follow.objects.order_by('-author_id').first()
+        if favorite is None or follow is None:
+            raise CommandError('No favorites or follows, use --seed')
+        full_scan = FULL_SCANS[connection.vendor]
+        failed = []
+        for title, queryset in hot_queries(favorite.user, favorite.recipe,
+                                           follow.author):
+            plan = queryset.explain()
+            tables = [match.group(match.lastindex)
+                      for match in full_scan.finditer(plan)]
+            if tables:
+                failed.append(title)
+                self.stdout.write(f'FAIL {title}: {", ".join(tables)}')
+            else:
+                self.stdout.write(f'OK   {title}')
+            if tables or verbosity > 1:
+                self.stdout.write(plan)
+        return failed
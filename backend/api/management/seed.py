@@ -0,0 +1,136 @@
+import random
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from recipes.counters import reconcile
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            RecipeScore, ShoppingCart, Tag, TimelineEntry)
+from recipes.reference import cached_ingredients, cached_tags
+from recipes.search import update_search_index
+from recipes.versions import recipes_version
+from users.models import Follow, User
+
+PREFIX = 'benchmark'
+
+
+class RollbackError(Exception):
+    pass
+
+
+def request_factory():
+    host = settings.ALLOWED_HOSTS[0].strip().lstrip('.')
+    if host in ('', '*'):
+        host = 'localhost'
+    return APIRequestFactory(SERVER_NAME=host, HTTP_HOST=host)
+
+
+@contextmanager
+def rolled_back(rollback=True):
+    try:
+        with transaction.atomic():
+            yield
+            if rollback:
+                raise RollbackError
+    except RollbackError:
+        cached_tags.invalidate()
+        cached_ingredients.invalidate()
+        recipes_version.invalidate()
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def seed(recipes, batch_size=5000, log=print):
+    rng = random.Random(recipes)
+    tags = list(Tag.objects.values_list('id', flat=True))
+    if len(tags) < 7:
+        Tag.objects.bulk_create(
+            [Tag(name=f'{PREFIX} {i}', color=f'#{i:06x}',
+                 slug=f'{PREFIX}-{i}') for i in range(7)],
+            ignore_conflicts=True
+        )
+        tags = list(Tag.objects.values_list('id', flat=True))
+    ingredients = list(Ingredient.objects.values_list('id', flat=True))
+    if len(ingredients) < 100:
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=f'{PREFIX} {i}', measurement_unit='г')
+             for i in range(100)],
+            ignore_conflicts=True
+        )
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+    cached_tags.invalidate()
+    cached_ingredients.invalidate()
+
+    users_count = max(recipes // 20, 10)
+    User.objects.bulk_create(
+        User(username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@example.com',
+             first_name=PREFIX, last_name=str(i), password='!')
+        for i in range(users_count)
+    )
+    users = list(User.objects.filter(
+        username__startswith=PREFIX
+    ).values_list('id', flat=True))
+    log(f'Users: {len(users)}')
+
+    for batch in batches(range(recipes), batch_size):
+        Recipe.objects.bulk_create(
+            Recipe(author_id=rng.choice(users), name=f'{PREFIX} {i}',
+                   text=PREFIX, image='recipe/benchmark.png',
+                   cooking_time=rng.randint(1, 240))
+            for i in batch
+        )
+    recipe_ids = list(Recipe.objects.filter(
+        name__startswith=PREFIX
+    ).values_list('id', flat=True))
+    log(f'Recipes: {len(recipe_ids)}')
+
+    through = Recipe.tags.through
+    for batch in batches(recipe_ids, batch_size):
+        through.objects.bulk_create(
+            through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in batch
+            for tag_id in rng.sample(tags, rng.randint(1, 3))
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe_id=recipe_id, ingredient_id=ingredient,
+                               amount=rng.randint(1, 500))
+            for recipe_id in batch
+            for ingredient in rng.sample(ingredients, rng.randint(2, 6))
+        )
+        update_search_index(batch)
+    log('Tags and ingredients linked')
+
+    for model, per_user in ((Favorite, 20), (ShoppingCart, 5)):
+        for batch in batches(users, batch_size // per_user):
+            model.objects.bulk_create(
+                (model(user_id=user_id, recipe_id=recipe_id)
+                 for user_id in batch
+                 for recipe_id in set(rng.choices(recipe_ids, k=per_user))),
+                ignore_conflicts=True
+            )
+    for batch in batches(users, batch_size // 10):
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id in batch
+             for author_id in set(rng.choices(users, k=10))
+             if author_id != user_id),
+            ignore_conflicts=True
+        )
+    log('Favorites, carts and follows added')
+    reconcile()
+    RecipeScore.objects.rebuild()
+    for author_id in TimelineEntry.objects.authors():
+        TimelineEntry.objects.fill(author_id)
+    recipes_version.invalidate()
+    log('Counters, scores and timelines updated')
+    return users
@@ -0,0 +1,101 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from datetime import datetime
+from heapq import merge
+from itertools import islice
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class RecipePagination(PageNumberPagination):
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (self.cursor_query_param in request.query_params
+                       and isinstance(queryset, QuerySet)
+                       and not queryset.query.order_by)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        page = list(self.after(queryset, cursor)[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = (page[-1].pub_date, page[-1].pk)
+        return page
+
+    @staticmethod
+    def after(queryset, cursor, date_field='pub_date', id_field='id'):
+        queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+        if not cursor:
+            return queryset
+        pub_date, pk = cursor
+        return queryset.filter(**{f'{date_field}__lte': pub_date}).filter(
+            Q(**{f'{date_field}__lt': pub_date}) | Q(**{f'{id_field}__lt': pk})
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(*self.next_position))
+
+    @staticmethod
+    def encode_cursor(pub_date, pk):
+        return urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{pk}'.encode()
+        ).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class FeedPagination(RecipePagination):
+
+    def paginate_queryset(self, sources, request, view=None):
+        self.keyset = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        page = list(islice(merge(
+            *(self.after(queryset, cursor, date_field, id_field)[
+                :page_size + 1
+            ] for queryset, date_field, id_field in sources),
+            reverse=True
+        ), page_size + 1))
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = page[-1]
+        return [pk for _, pk in page]
@@ -0,0 +1,137 @@
+import csv
+import json
+from abc import ABCMeta, abstractmethod
+from io import BytesIO
+
+import orjson
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        ).replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace(
+            '\u2029'.encode(), b'\\u2029'
+        )
+
+
+class ShoppingListRenderer(BaseRenderer, metaclass=ABCMeta):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return str(data).encode(self.charset or 'utf-8')
+
+    def stream(self, user, ingredients):
+        yield self.header(user)
+        for index, ingredient in enumerate(ingredients):
+            yield self.row(index, ingredient['ingredient__name'],
+                           ingredient['ingredient__measurement_unit'],
+                           ingredient['amount'])
+        yield self.footer()
+
+    def header(self, user):
+        return ''
+
+    @abstractmethod
+    def row(self, index, name, measurement_unit, amount):
+        pass
+
+    def footer(self):
+        return ''
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def header(self, user):
+        return f'Список покупок для: {user.get_full_name()}\n'
+
+    def row(self, index, name, measurement_unit, amount):
+        return f'\n- {name} ({measurement_unit}) - {amount}'
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    writer = csv.writer(Echo())
+
+    def header(self, user):
+        return self.writer.writerow(('name', 'measurement_unit', 'amount'))
+
+    def row(self, index, name, measurement_unit, amount):
+        return self.writer.writerow((name, measurement_unit, amount))
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def header(self, user):
+        return '['
+
+    def row(self, index, name, measurement_unit, amount):
+        return (', ' if index else '') + json.dumps({
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        }, ensure_ascii=False)
+
+    def footer(self):
+        return ']'
+
+
+class PDFShoppingListRenderer(TextShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font = 'ShoppingList'
+    font_size = 12
+    margin = 50
+
+    def stream(self, user, ingredients):
+        if self.font not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font, settings.SHOPPING_LIST_PDF_FONT)
+            )
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        top = height - self.margin
+        line = top
+        for chunk in super().stream(user, ingredients):
+            for text in filter(None, chunk.splitlines()):
+                if line < self.margin:
+                    pdf.showPage()
+                    line = top
+                pdf.setFont(self.font, self.font_size)
+                pdf.drawString(self.margin, line, text)
+                line -= self.font_size * 1.5
+        pdf.save()
+        yield buffer.getvalue()
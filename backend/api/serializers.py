@@ -1,14 +1,116 @@
-from django.db.models import F
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.functional import cached_property
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from drf_extra_fields.fields import Base64FileField, Base64ImageField
+from PIL import Image
 from rest_framework.exceptions import ValidationError
 from rest_framework import serializers, status
 
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+from recipes.counters import change_counter, change_counters, lock_user
+from recipes.images import delete_files_on_commit, image_files
+from recipes.models import (Favorite, ImageStatus, Ingredient,
+                            IngredientInRecipe, Recipe, RecipeScore,
+                            ShoppingCart, ShoppingList, Tag, TimelineEntry)
+from recipes.pantry import pantry_index
+from recipes.reference import cached_ingredients, cached_tags
+from recipes.search import highlight_markup, update_search_index
+from recipes.versions import user_version
 from users.models import Follow, User
 
 
+def in_bulk(reference, pks):
+    found = reference.in_bulk(set(pks))
+    missing = sorted(set(pks) - found.keys())
+    if missing:
+        raise ValidationError(
+            'Недопустимые первичные ключи, объекты не существуют: '
+            + ', '.join(str(pk) for pk in missing)
+        )
+    return found
+
+
+class PrimaryKeyListField(serializers.ListField):
+    child = serializers.IntegerField()
+
+    def __init__(self, reference, **kwargs):
+        self.reference = reference
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        found = in_bulk(self.reference, pks)
+        return [found[pk] for pk in pks]
+
+
+class Base64ImageUploadField(Base64FileField):
+    ALLOWED_TYPES = Base64ImageField.ALLOWED_TYPES
+    INVALID_FILE_MESSAGE = Base64ImageField.INVALID_FILE_MESSAGE
+    INVALID_TYPE_MESSAGE = Base64ImageField.INVALID_TYPE_MESSAGE
+    get_file_extension = Base64ImageField.get_file_extension
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        try:
+            Image.open(file).verify()
+        except Exception:
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        file.seek(0)
+        return file
+
+
+INLINE_PARAM = 'image'
+INLINE_VALUE = 'inline_thumb'
+
+
+def media_url(name, request=None):
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def recipe_image(recipe, rendition, request=None):
+    found = recipe.image_renditions.get(rendition)
+    if found:
+        return media_url(found['name'], request)
+    return media_url(recipe.image.name, request) if recipe.image else None
+
+
+def recipe_image_renditions(recipe, request=None):
+    renditions = {
+        title: {
+            'url': media_url(rendition['name'], request),
+            'width': rendition['width'],
+            'height': rendition['height'],
+        }
+        for title, rendition in recipe.image_renditions.items()
+        if title != 'placeholder'
+    }
+    if request and request.query_params.get(INLINE_PARAM) == INLINE_VALUE:
+        renditions['placeholder'] = recipe.image_renditions.get(
+            'placeholder'
+        )
+    return renditions
+
+
+class RecipeImageField(serializers.Field):
+
+    def __init__(self, rendition=None, **kwargs):
+        self.rendition = rendition
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return recipe_image(recipe, self.rendition,
+                            self.context.get('request'))
+
+
+class RecipeImageRenditionsField(RecipeImageField):
+
+    def to_representation(self, recipe):
+        return recipe_image_renditions(recipe, self.context.get('request'))
+
+
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
@@ -24,13 +126,14 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and obj.following.filter(user=request.user).exists())
 
 
 class FollowSerializer(CustomUserSerializer):
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta(CustomUserSerializer.Meta):
@@ -39,15 +142,16 @@ class FollowSerializer(CustomUserSerializer):
         )
         read_only_fields = ('email', 'username')
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            request = self.context.get('request')
+            limit = RecipesLimitSerializer(data=request.query_params)
+            limit.is_valid(raise_exception=True)
+            recipes = obj.recipes.all()
+            if 'recipes_limit' in limit.validated_data:
+                recipes = recipes[:limit.validated_data['recipes_limit']]
         return RecipeShortSerializer(recipes, many=True, read_only=True).data
 
 
@@ -72,6 +176,16 @@ class FollowAddSerializer(CustomUserSerializer):
             )
         return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        lock_user(validated_data['user'].pk)
+        follow = super().create(validated_data)
+        change_counter(User, follow.author_id, 'followers_count', 1)
+        follow.author.refresh_from_db(fields=['followers_count'])
+        TimelineEntry.objects.backfill(follow.user_id, follow.author)
+        user_version(follow.user_id).invalidate_on_commit()
+        return follow
+
     def to_representation(self, instance):
         return FollowSerializer(
             instance.author,
@@ -93,54 +207,32 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class AddIngredientInRecipeListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        found = in_bulk(cached_ingredients,
+                        [ingredient['id'] for ingredient in ingredients])
+        for ingredient in ingredients:
+            ingredient['id'] = found[ingredient['id']]
+        return ingredients
+
+
 class AddIngredientInRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'amount')
-
-
-class RecipeReadOnlySerializer(serializers.ModelSerializer):
-    tags = TagSerializer(many=True)
-    author = CustomUserSerializer(read_only=True)
-    ingredients = serializers.SerializerMethodField()
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
-
-    class Meta:
-        model = Recipe
-        fields = ('id', 'tags', 'author', 'ingredients',
-                  'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
-
-    def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredientinrecipe__amount')
-        )
-
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        return (request and request.user.is_authenticated
-                and request.user.favorites.filter(recipe=obj).exists())
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        return (request and request.user.is_authenticated
-                and request.user.shopping_cart.filter(recipe=obj).exists())
+        list_serializer_class = AddIngredientInRecipeListSerializer
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = PrimaryKeyListField(reference=cached_tags)
     author = CustomUserSerializer(read_only=True)
     ingredients = AddIngredientInRecipeSerializer(many=True)
-    image = Base64ImageField()
+    image = Base64ImageUploadField()
 
     class Meta:
         model = Recipe
@@ -150,29 +242,21 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     def validate_ingredients(self, value):
         if not value:
             raise ValidationError('Нужен минимум один ингредиент!')
-        ingredients_list = []
-        for ingredient in value:
-            ingredient_id = ingredient['id']
-            if ingredient_id in ingredients_list:
-                raise serializers.ValidationError({
-                    'Ингредиенты должны быть уникальными!'
-                })
-            ingredients_list.append(ingredient_id)
-            amount = ingredient['amount']
-            if int(amount) <= 0:
-                raise serializers.ValidationError({
-                    'Количество ингредиента должно быть больше нуля!'
-                })
+        if len({ingredient['id'] for ingredient in value}) != len(value):
+            raise serializers.ValidationError({
+                'Ингредиенты должны быть уникальными!'
+            })
+        if any(ingredient['amount'] <= 0 for ingredient in value):
+            raise serializers.ValidationError({
+                'Количество ингредиента должно быть больше нуля!'
+            })
         return value
 
     def validate_tags(self, value):
         if not value:
             raise ValidationError('Нужен минимум один тег!')
-        tag_list = []
-        for tag in value:
-            if tag in tag_list:
-                raise ValidationError('Теги не могут повторяться!')
-            tag_list.append(tag)
+        if len(set(value)) != len(value):
+            raise ValidationError('Теги не могут повторяться!')
         return value
 
     def validate_cooking_time(self, value):
@@ -194,9 +278,41 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def create_tags(tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
+        recipe.tags.add(*tags)
 
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        current = {
+            ingredient.ingredient_id: ingredient
+            for ingredient in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        old_amounts = {
+            ingredient_id: ingredient.amount
+            for ingredient_id, ingredient in current.items()
+        }
+        created, changed = [], []
+        for ingredient_id, amount in amounts.items():
+            ingredient = current.get(ingredient_id)
+            if ingredient is None:
+                created.append(IngredientInRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+            elif ingredient.amount != amount:
+                ingredient.amount = amount
+                changed.append(ingredient)
+        IngredientInRecipe.objects.filter(id__in=[
+            ingredient.id for ingredient_id, ingredient in current.items()
+            if ingredient_id not in amounts
+        ]).delete()
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        IngredientInRecipe.objects.bulk_create(created)
+        return old_amounts, amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
@@ -204,28 +320,57 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=author, **validated_data)
         self.create_tags(tags, recipe)
         self.create_ingredients(ingredients, recipe)
+        change_counter(User, author.pk, 'recipes_count', 1)
+        RecipeScore.objects.create(recipe=recipe)
+        update_search_index([recipe.pk])
+        pantry_index.changed([recipe.pk])
+        TimelineEntry.objects.fan_out(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
-        return super().update(instance, validated_data)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            delete_files_on_commit(image_files(instance))
+            validated_data['image_status'] = ImageStatus.PENDING
+            validated_data['image_renditions'] = {}
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            old, new = self.update_ingredients(ingredients, instance)
+            ShoppingList.objects.change_amounts(
+                list(instance.shopping_cart.values_list('user_id',
+                                                        flat=True)),
+                {
+                    ingredient_id: (new.get(ingredient_id, 0)
+                                    - old.get(ingredient_id, 0))
+                    for ingredient_id in old.keys() | new.keys()
+                }
+            )
+        instance = super().update(instance, validated_data)
+        update_search_index([instance.pk])
+        pantry_index.changed([instance.pk])
+        return instance
 
     def to_representation(self, instance):
-        return RecipeReadOnlySerializer(
+        request = self.context.get('request')
+        instance = Recipe.objects.with_user_data(request.user).get(
+            pk=instance.pk
+        )
+        return FastRecipeSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         ).data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField(rendition=settings.RECIPE_IMAGE_SHORT_RENDITION)
+    image_renditions = RecipeImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -245,6 +390,14 @@ class FavoriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({'Рецепт уже в избранном!'})
         return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        lock_user(validated_data['user'].pk)
+        favorite = super().create(validated_data)
+        change_counter(Recipe, favorite.recipe_id, 'favorites_count', 1)
+        user_version(favorite.user_id).invalidate_on_commit()
+        return favorite
+
     def to_representation(self, instance):
         {'request': self.context.get('request')}
         return RecipeShortSerializer(
@@ -269,8 +422,219 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({'Рецепт уже в корзине!'})
         return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        lock_user(validated_data['user'].pk)
+        shopping_cart = super().create(validated_data)
+        ShoppingList.objects.add_recipe([shopping_cart.user_id],
+                                        shopping_cart.recipe)
+        change_counter(Recipe, shopping_cart.recipe_id, 'in_carts_count', 1)
+        user_version(shopping_cart.user_id).invalidate_on_commit()
+        return shopping_cart
+
     def to_representation(self, instance):
         return RecipeShortSerializer(
             instance.recipe,
             context={'request': self.context.get('request')}
         ).data
+
+
+class BulkRelationSerializer(serializers.Serializer):
+    model = None
+    target = None
+    field = None
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_ACTION_MAX_ITEMS
+    )
+
+    def related(self, user, ids):
+        return self.model.objects.filter(
+            user=user, **{f'{self.field}_id__in': ids}
+        ).values_list(f'{self.field}_id', flat=True)
+
+    def known(self, ids):
+        return set(self.target.objects.filter(pk__in=ids).values_list(
+            'pk', flat=True
+        ))
+
+    def allowed(self, user, pk):
+        return True
+
+    @staticmethod
+    def results(ids, statuses):
+        return [{'id': pk, 'status': statuses[pk]} for pk in ids]
+
+    @transaction.atomic
+    def add(self, user):
+        ids = list(dict.fromkeys(self.validated_data['ids']))
+        lock_user(user.pk)
+        known, linked = self.known(ids), set(self.related(user, ids))
+        statuses = {
+            pk: 'not_found' if pk not in known
+            else 'exists' if pk in linked
+            else 'created' if self.allowed(user, pk)
+            else 'invalid'
+            for pk in ids
+        }
+        created = [pk for pk in ids if statuses[pk] == 'created']
+        if created:
+            self.model.objects.bulk_create(
+                [self.model(user=user, **{f'{self.field}_id': pk})
+                 for pk in created],
+                ignore_conflicts=True
+            )
+            self.added(user, created)
+            user_version(user.pk).invalidate_on_commit()
+        return self.results(ids, statuses)
+
+    @transaction.atomic
+    def remove(self, user):
+        ids = list(dict.fromkeys(self.validated_data['ids']))
+        lock_user(user.pk)
+        deleted = set(self.related(user, ids))
+        known = self.known(set(ids) - deleted)
+        if deleted:
+            self.model.objects.filter(
+                user=user, **{f'{self.field}_id__in': deleted}
+            ).delete()
+            self.removed(user, sorted(deleted))
+            user_version(user.pk).invalidate_on_commit()
+        return self.results(ids, {
+            pk: 'deleted' if pk in deleted
+            else 'absent' if pk in known
+            else 'not_found'
+            for pk in ids
+        })
+
+
+class BulkFavoriteSerializer(BulkRelationSerializer):
+    model = Favorite
+    target = Recipe
+    field = 'recipe'
+
+    def added(self, user, ids):
+        change_counters(Recipe, ids, 'favorites_count', 1)
+
+    def removed(self, user, ids):
+        change_counters(Recipe, ids, 'favorites_count', -1)
+
+
+class BulkShoppingCartSerializer(BulkRelationSerializer):
+    model = ShoppingCart
+    target = Recipe
+    field = 'recipe'
+
+    def added(self, user, ids):
+        ShoppingList.objects.add_recipe([user.pk], *ids)
+        change_counters(Recipe, ids, 'in_carts_count', 1)
+
+    def removed(self, user, ids):
+        ShoppingList.objects.remove_recipe([user.pk], *ids)
+        change_counters(Recipe, ids, 'in_carts_count', -1)
+
+
+class BulkFollowSerializer(BulkRelationSerializer):
+    model = Follow
+    target = User
+    field = 'author'
+
+    def allowed(self, user, pk):
+        return pk != user.pk
+
+    def added(self, user, ids):
+        change_counters(User, ids, 'followers_count', 1)
+        for author in User.objects.filter(pk__in=ids):
+            TimelineEntry.objects.backfill(user.pk, author)
+
+    def removed(self, user, ids):
+        change_counters(User, ids, 'followers_count', -1)
+        TimelineEntry.objects.unfollowed(user, ids)
+
+
+class FastReadSerializer(serializers.BaseSerializer):
+    user_fields = ('email', 'id', 'username', 'first_name', 'last_name')
+
+    @cached_property
+    def request(self):
+        return self.context.get('request')
+
+    def user(self, user):
+        data = {field: getattr(user, field) for field in self.user_fields}
+        data['is_subscribed'] = user.is_subscribed
+        return data
+
+
+class FastRecipeSerializer(FastReadSerializer):
+    tag_fields = ('id', 'name', 'color', 'slug')
+
+    def to_representation(self, recipe):
+        request = self.request
+        data = {
+            'id': recipe.id,
+            'tags': [
+                {field: getattr(tag, field) for field in self.tag_fields}
+                for tag in recipe.tags.all()
+            ],
+            'author': self.user(recipe.author),
+            'ingredients': [
+                {
+                    'id': item.ingredient.id,
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.ingredient_list.all()
+            ],
+            'is_favorited': recipe.is_favorited,
+            'is_in_shopping_cart': recipe.is_in_shopping_cart,
+            'name': recipe.name,
+            'image': recipe_image(recipe, settings.RECIPE_IMAGE_RENDITION,
+                                  request),
+            'image_renditions': recipe_image_renditions(recipe, request),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+        if hasattr(recipe, 'search_name'):
+            data['highlight'] = {
+                'name': highlight_markup(recipe.search_name),
+                'text': highlight_markup(recipe.search_text),
+            }
+        return data
+
+
+class FastFollowSerializer(FastReadSerializer):
+
+    def to_representation(self, user):
+        data = self.user(user)
+        data['recipes'] = [
+            {
+                'id': recipe.id,
+                'name': recipe.name,
+                'image': recipe_image(
+                    recipe, settings.RECIPE_IMAGE_SHORT_RENDITION
+                ),
+                'image_renditions': recipe_image_renditions(recipe),
+                'cooking_time': recipe.cooking_time,
+            }
+            for recipe in user.limited_recipes
+        ]
+        data['recipes_count'] = user.recipes_count
+        return data
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+    missing = serializers.IntegerField(
+        min_value=0,
+        max_value=settings.PANTRY_MAX_MISSING,
+        default=settings.PANTRY_MAX_MISSING
+    )
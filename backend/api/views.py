@@ -1,5 +1,7 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (BooleanField, OuterRef, Prefetch, Subquery,
+                              Value)
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from django_filters.rest_framework import DjangoFilterBackend
@@ -8,43 +10,128 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework import permissions, status, viewsets
 
+from .caching import ConditionalResponseMixin
 from .filters import IngredientSearchFilter, RecipeFilter
+from .pagination import FeedPagination, RecipePagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (CustomUserSerializer, FavoriteSerializer,
-                          FollowAddSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeReadOnlySerializer,
-                          RecipeWriteSerializer, ShoppingCartSerializer,
-                          TagSerializer)
-
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+from .renderers import (CSVShoppingListRenderer, JSONShoppingListRenderer,
+                        PDFShoppingListRenderer, TextShoppingListRenderer)
+from .serializers import (BulkFavoriteSerializer, BulkFollowSerializer,
+                          BulkShoppingCartSerializer, CustomUserSerializer,
+                          FastFollowSerializer, FastRecipeSerializer,
+                          FavoriteSerializer, FollowAddSerializer,
+                          IngredientSerializer, PantrySerializer,
+                          RecipesLimitSerializer, RecipeWriteSerializer,
+                          ShoppingCartSerializer, TagSerializer)
+
+from recipes.counters import change_counter, lock_user
+from recipes.images import delete_files_on_commit, image_files
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeNeighbor,
+                            ShoppingCart, ShoppingList, Tag, TimelineEntry)
+from recipes.pantry import pantry_index
+from recipes.reference import cached_ingredients, cached_tags
+from recipes.versions import recipes_version, user_version
 from users.models import Follow, User
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+def bulk_change(request, serializer_class):
+    serializer = serializer_class(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    if request.method == 'POST':
+        results = serializer.add(request.user)
+    else:
+        results = serializer.remove(request.user)
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class ReferenceDataMixin:
+    reference = None
+
+    def get_queryset(self):
+        objects = self.reference.all()
+        if objects is None:
+            return super().get_queryset()
+        return objects
+
+    def get_object(self):
+        if self.reference.all() is None:
+            return super().get_object()
+        try:
+            obj = self.reference.get(int(self.kwargs[self.lookup_field]))
+        except ValueError:
+            obj = None
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class TagViewSet(ConditionalResponseMixin, ReferenceDataMixin,
+                 viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
+    reference = cached_tags
+    versions = (cached_tags.shared,)
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalResponseMixin, ReferenceDataMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
+    reference = cached_ingredients
+    versions = (cached_ingredients.shared,)
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('^name',)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(ConditionalResponseMixin, viewsets.ModelViewSet):
+    versions = (recipes_version, cached_tags.shared, cached_ingredients.shared)
+    per_user = True
+    cache_shared = True
+    per_user_params = ('is_favorited', 'is_in_shopping_cart')
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return Recipe.objects.with_user_data(self.request.user)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingList.objects.remove_recipe(
+            list(instance.shopping_cart.values_list('user_id', flat=True)),
+            instance
+        )
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+        delete_files_on_commit(image_files(instance))
+        instance.delete()
+
+    def overlay(self, request, data):
+        recipes = data['results'] if 'results' in data else [data]
+        state = Recipe.objects.user_state(
+            request.user,
+            {recipe['id'] for recipe in recipes},
+            {recipe['author']['id'] for recipe in recipes}
+        )
+        recipes = [{
+            **recipe,
+            'author': {
+                **recipe['author'],
+                'is_subscribed': recipe['author']['id'] in state['subscribed']
+            },
+            'is_favorited': recipe['id'] in state['favorited'],
+            'is_in_shopping_cart': recipe['id'] in state['in_cart'],
+        } for recipe in recipes]
+        if 'results' in data:
+            return {**data, 'results': recipes}
+        return recipes[0]
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
-            return RecipeReadOnlySerializer
+            return FastRecipeSerializer
         return RecipeWriteSerializer
 
     @action(detail=True, methods=['post'],
@@ -54,9 +141,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
                            serializers=FavoriteSerializer, pk=pk)
 
     @favorite.mapping.delete
+    @transaction.atomic
     def delete_favorite(self, request, pk):
-        return self.delete_from(request=request,
-                                model=Favorite, pk=pk)
+        lock_user(request.user.pk)
+        self.delete_from(request=request, model=Favorite, pk=pk)
+        change_counter(Recipe, pk, 'favorites_count', -1)
+        user_version(request.user.pk).invalidate_on_commit()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post'],
             permission_classes=(permissions.IsAuthenticated,))
@@ -65,21 +156,84 @@ class RecipeViewSet(viewsets.ModelViewSet):
                            serializers=ShoppingCartSerializer, pk=pk)
 
     @shopping_cart.mapping.delete
+    @transaction.atomic
     def delete_shopping_cart(self, request, pk):
-        return self.delete_from(request=request,
-                                model=ShoppingCart, pk=pk)
+        lock_user(request.user.pk)
+        self.delete_from(request=request, model=ShoppingCart, pk=pk)
+        ShoppingList.objects.remove_recipe([request.user.id], pk)
+        change_counter(Recipe, pk, 'in_carts_count', -1)
+        user_version(request.user.pk).invalidate_on_commit()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'],
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite', url_name='bulk-favorite',
+            permission_classes=(permissions.IsAuthenticated,))
+    def bulk_favorite(self, request):
+        return bulk_change(request, BulkFavoriteSerializer)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', url_name='bulk-shopping-cart',
+            permission_classes=(permissions.IsAuthenticated,))
+    def bulk_shopping_cart(self, request):
+        return bulk_change(request, BulkShoppingCartSerializer)
+
+    def recipes_page(self, request, recipe_ids):
+        page = self.paginate_queryset(recipe_ids)
+        recipes = self.get_queryset().in_bulk(page)
+        return FastRecipeSerializer(
+            [recipes[pk] for pk in page if pk in recipes],
+            many=True,
+            context={'request': request}
+        ).data
+
+    @action(detail=False,
+            permission_classes=(permissions.IsAuthenticated,),
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        return self.get_paginated_response(self.recipes_page(
+            request, TimelineEntry.objects.sources(request.user)
+        ))
+
+    @action(detail=False,
             permission_classes=(permissions.IsAuthenticated,))
+    def recommended(self, request):
+        return self.get_paginated_response(self.recipes_page(
+            request, RecipeNeighbor.objects.recommended(request.user)
+        ))
+
+    @action(detail=False, url_path='what-can-i-cook')
+    def what_can_i_cook(self, request):
+        pantry = PantrySerializer(data=request.query_params)
+        pantry.is_valid(raise_exception=True)
+        ingredient_ids = set(pantry.validated_data['ingredients'])
+        data = self.recipes_page(request, pantry_index.match(
+            ingredient_ids, pantry.validated_data['missing']
+        ))
+        for recipe in data:
+            recipe['missing_ingredients'] = [
+                ingredient for ingredient in recipe['ingredients']
+                if ingredient['id'] not in ingredient_ids
+            ]
+        return self.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,),
+            renderer_classes=(TextShoppingListRenderer,
+                              CSVShoppingListRenderer,
+                              JSONShoppingListRenderer,
+                              PDFShoppingListRenderer))
     def download_shopping_cart(self, request):
+        return self.conditional(self.shopping_cart_file, request)
+
+    def shopping_cart_file(self, request):
         user = request.user
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
+        ingredients = ShoppingList.objects.filter(user=user).values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).order_by('ingredient__name').annotate(amount=Sum('amount'))
-        return self.shopping_file(user, ingredients)
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by('ingredient__name')
+        return self.shopping_file(user, ingredients.iterator(),
+                                  request.accepted_renderer)
 
     @staticmethod
     def add_to(request, serializers, pk):
@@ -99,18 +253,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @staticmethod
-    def shopping_file(user, ingredients):
-        shopping_list = (
-            f'Список покупок для: {user.get_full_name()}\n\n'
-        )
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+    def shopping_file(user, ingredients, renderer):
+        filename = f'{user.username}_shopping_list.{renderer.format}'
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(renderer.stream(user, ingredients),
+                                         content_type=content_type)
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
@@ -126,29 +275,62 @@ class CustomUserViewSet(UserViewSet):
         methods=['post', 'delete'],
         permission_classes=(permissions.IsAuthenticated,)
     )
+    @transaction.atomic
     def subscribe(self, request, id):
         if request.method == 'POST':
+            RecipesLimitSerializer(data=request.query_params).is_valid(
+                raise_exception=True
+            )
             data = {'user': request.user.id, 'author': id}
             serializer = FollowAddSerializer(data=data,
                                              context={'request': request})
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        lock_user(request.user.pk)
         get_object_or_404(Follow, user=request.user,
                           author=get_object_or_404(User, id=id)).delete()
+        change_counter(User, id, 'followers_count', -1)
+        TimelineEntry.objects.unfollowed(request.user, [id])
+        user_version(request.user.pk).invalidate_on_commit()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe',
+        url_name='bulk-subscribe',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def bulk_subscribe(self, request):
+        return bulk_change(request, BulkFollowSerializer)
+
     @action(
         detail=False,
         permission_classes=(permissions.IsAuthenticated,)
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        recipes = Recipe.objects.only('id', 'name', 'image',
+                                      'image_renditions', 'cooking_time',
+                                      'author_id')
+        limit = RecipesLimitSerializer(data=request.query_params)
+        limit.is_valid(raise_exception=True)
+        if 'recipes_limit' in limit.validated_data:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author_id=OuterRef('author_id')
+                ).values('pk')[:limit.validated_data['recipes_limit']]
+            ))
+        queryset = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by(*User._meta.ordering, 'id').prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
         pages = self.paginate_queryset(queryset)
-        serializer = FollowSerializer(pages,
-                                      many=True,
-                                      context={'request': request})
+        serializer = FastFollowSerializer(pages,
+                                          many=True,
+                                          context={'request': request})
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -81,6 +81,32 @@ DATABASES = {
 }
 
 
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache')
+
+# Version tokens and the pantry change log must survive culling, so the
+# default alias gets a ceiling it never reaches in practice; response bodies
+# live in their own alias, where culling only costs a re-render.
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10 ** 7)),
+        },
+    },
+    'responses': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION',
+                              os.path.join(CACHE_LOCATION, 'responses')),
+        'TIMEOUT': 10 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -123,6 +149,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
@@ -146,3 +181,46 @@ DJOSER = {
 MODELS_LENGHT_TEXT = 200
 MODELS_LENGHT_USER = 150
 MODELS_LENGHT_EMAIL = 254
+
+INGREDIENTS_AUTOCOMPLETE_LIMIT = 20
+
+REFERENCE_CACHE_MAX_ROWS = 100000
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_IMAGE_RENDITIONS = {
+    'small': 320,
+    'medium': 640,
+    'large': 1280,
+}
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_PLACEHOLDER_WIDTH = 16
+RECIPE_IMAGE_RENDITION = 'large'
+RECIPE_IMAGE_SHORT_RENDITION = 'small'
+
+RECIPE_POPULAR_DAYS = 7
+RECIPE_TRENDING_DAYS = 14
+RECIPE_TRENDING_HALF_LIFE_HOURS = 48
+
+RECIPE_SEARCH_CONFIG = 'russian'
+
+PANTRY_MAX_MISSING = 2
+PANTRY_INDEX_MAX_CHANGES = 1000
+
+RECOMMENDATION_NEIGHBORS = 20
+RECOMMENDATION_SEEDS = 50
+RECOMMENDATION_WEIGHTS = {
+    'favorites': 1.0,
+    'follows': 0.3,
+    'ingredients': 0.5,
+    'tags': 0.2,
+}
+RECOMMENDATION_MAX_INGREDIENT_SHARE = 0.05
+
+FEED_FANOUT_LIMIT = 10000
+FEED_BACKFILL_RECIPES = 100
+
+BULK_ACTION_MAX_ITEMS = 100
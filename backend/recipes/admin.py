@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from .models import (Favorite, IngredientInRecipe, Ingredient,
-                     Recipe, ShoppingCart, Tag)
+from .models import (Favorite, IngredientInRecipe, Ingredient, Recipe,
+                     RecipeNeighbor, RecipeScore, ShoppingCart, ShoppingList,
+                     Tag)
 
 
 class AdminIngredientInRecipe(admin.TabularInline):
@@ -18,9 +19,10 @@ class RecipeAdmin(admin.ModelAdmin):
         AdminIngredientInRecipe,
     ]
 
-    @admin.display(description='Добавлено в избранное')
+    @admin.display(description='Добавлено в избранное',
+                   ordering='favorites_count')
     def added_to_favorite(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @admin.display(description='Ингредиенты')
     def ingredients_recipe(self, obj):
@@ -41,11 +43,23 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
 
 
 class FavoriteAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'recipe')
+    list_display = ('id', 'user', 'recipe', 'created')
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'recipe')
+    list_display = ('id', 'user', 'recipe', 'created')
+
+
+class ShoppingListAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+
+
+class RecipeScoreAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'popular', 'trending')
+
+
+class RecipeNeighborAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'neighbor', 'similarity')
 
 
 admin.site.register(Recipe, RecipeAdmin)
@@ -54,3 +68,6 @@ admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(IngredientInRecipe, IngredientInRecipeAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingList, ShoppingListAdmin)
+admin.site.register(RecipeScore, RecipeScoreAdmin)
+admin.site.register(RecipeNeighbor, RecipeNeighborAdmin)
@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def lock_user(user_id):
+    list(User.objects.select_for_update().filter(
+        pk=user_id
+    ).values_list('pk', flat=True))
+
+
+def change_counter(model, pk, field, delta):
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def actual_count(counted, foreign_key):
+    return Coalesce(Subquery(
+        counted.objects.filter(
+            **{foreign_key: OuterRef('pk')}
+        ).order_by().values(foreign_key).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def drifted():
+    for model, field, counted, foreign_key in COUNTERS:
+        actual = actual_count(counted, foreign_key)
+        yield field, actual, model.objects.exclude(**{field: actual})
+
+
+@transaction.atomic
+def reconcile():
+    return {
+        field: rows.update(**{field: actual})
+        for field, actual, rows in drifted()
+    }
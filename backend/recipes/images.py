@@ -0,0 +1,86 @@
+import os
+from base64 import b64encode
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+
+def render_renditions(name):
+    with default_storage.open(name) as f:
+        image = Image.open(f)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    renditions = {
+        'original': {
+            'name': name, 'width': image.width, 'height': image.height
+        }
+    }
+    stem = os.path.splitext(name)[0]
+    full_size = None
+    for title, width in settings.RECIPE_IMAGE_RENDITIONS.items():
+        if image.width <= width and full_size:
+            renditions[title] = full_size
+            continue
+        rendition = image
+        if image.width > width:
+            rendition = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS
+            )
+        buffer = BytesIO()
+        rendition.save(buffer, 'WEBP',
+                       quality=settings.RECIPE_IMAGE_QUALITY)
+        renditions[title] = {
+            'name': default_storage.save(f'{stem}_{title}.webp',
+                                         ContentFile(buffer.getvalue())),
+            'width': rendition.width,
+            'height': rendition.height,
+        }
+        if rendition is image:
+            full_size = renditions[title]
+    renditions['placeholder'] = render_placeholder(image)
+    return renditions
+
+
+def render_placeholder(image):
+    width = settings.RECIPE_IMAGE_PLACEHOLDER_WIDTH
+    placeholder = image.resize(
+        (width, max(1, round(image.height * width / image.width))),
+        Image.BILINEAR
+    )
+    buffer = BytesIO()
+    placeholder.save(buffer, 'WEBP', quality=50)
+    return 'data:image/webp;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+def image_files(recipe):
+    names = {recipe.image.name} if recipe.image else set()
+    names.update(
+        rendition['name'] for rendition in recipe.image_renditions.values()
+        if isinstance(rendition, dict)
+    )
+    return names
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def delete_files_on_commit(names):
+    names = set(names)
+    transaction.on_commit(lambda: delete_files(names))
+
+
+def try_render_renditions(name):
+    try:
+        return render_renditions(name)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
@@ -1,41 +1,131 @@
+import json
+import os
 from csv import reader
+from itertools import islice
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient, Tag
+from recipes.reference import cached_ingredients, cached_tags
 
 
-ALREDY_LOADED_ERROR_MESSAGE = """
-If you need to reload the data from the CSV file,
-first delete the db.sqlite3 file to destroy the database.
-Then, run `python manage.py migrate` for a new empty
-database with tables"""
+DEFAULT_BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path, fields):
+    with open(path, encoding='utf8') as f:
+        for row in reader(f):
+            if len(row) != len(fields):
+                raise CommandError(f'{path}: bad row {row}')
+            yield dict(zip(fields, row))
+
+
+def read_json(path, fields):
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf8') as f:
+        buffer = ''
+        position = number = 0
+        while True:
+            position = skip_separators(buffer, position)
+            if position == len(buffer):
+                chunk = f.read(JSON_CHUNK_SIZE)
+                if not chunk:
+                    return
+                buffer, position = chunk, 0
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = f.read(JSON_CHUNK_SIZE)
+                if not chunk:
+                    raise CommandError(f'{path}: malformed JSON')
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            position = end
+            number += 1
+            try:
+                row = {field: item[field] for field in fields}
+            except (KeyError, TypeError):
+                raise CommandError(f'{path}: bad row {number}: {item}')
+            yield row
+
+
+def skip_separators(buffer, position):
+    while position < len(buffer) and buffer[position] in '[], \t\r\n':
+        position += 1
+    return position
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
 
 
 class Command(BaseCommand):
-    help = 'Loads data'
+    help = 'Loads ingredients and tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            help='Ingredients file, tags are not loaded when it is given'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='File format, taken from the extension by default'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows per INSERT'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Read and insert everything, then roll back'
+        )
 
     def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        sources = [(Ingredient, ('name', 'measurement_unit'),
+                    options['file'] or 'data/ingredients.csv')]
+        if not options['file']:
+            sources.append((Tag, ('name', 'color', 'slug'), 'data/tags.csv'))
+
+        with transaction.atomic():
+            for model, fields, path in sources:
+                file_format = (options['format']
+                               or os.path.splitext(path)[1].lstrip('.'))
+                if file_format not in READERS:
+                    raise CommandError(f'{path}: unknown format')
+                self.load(model, READERS[file_format](path, fields),
+                          options['batch_size'])
+            if options['dry_run']:
+                transaction.set_rollback(True)
+                self.stdout.write('Dry run, nothing saved')
+            else:
+                transaction.on_commit(cached_ingredients.invalidate)
+                transaction.on_commit(cached_tags.invalidate)
+
+        self.stdout.write('Loading completed')
 
-        print('Loading data')
-
-        with open('data/ingredients.csv', encoding='utf8') as f:
-            print('Loading ingredients')
-            csv_reader = reader(f)
-            for row_1, row_2 in csv_reader:
-                Ingredient.objects.get_or_create(
-                    name=row_1,
-                    measurement_unit=row_2
-                )
-
-        with open('data/tags.csv', encoding='utf8') as f:
-            print('Loading tags')
-            csv_reader = reader(f)
-            for row_1, row_2, row_3 in csv_reader:
-                Tag.objects.get_or_create(
-                    name=row_1,
-                    color=row_2,
-                    slug=row_3
-                )
-
-        print('Loading completed')
+    def load(self, model, rows, batch_size):
+        name = model._meta.verbose_name_plural
+        before = model.objects.count()
+        processed = 0
+        while True:
+            batch = [model(**row) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            processed += len(batch)
+            self.stdout.write(f'{name}: {processed} rows processed')
+        created = model.objects.count() - before
+        self.stdout.write(
+            f'{name}: {created} created, {processed - created} skipped'
+        )
@@ -0,0 +1,109 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from time import sleep
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.images import delete_files, try_render_renditions
+from recipes.models import ImageStatus, Recipe
+from recipes.versions import recipes_version
+
+
+class Command(BaseCommand):
+    help = 'Generates recipe image renditions queued by the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Worker processes that decode and resize images'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Recipes taken from the queue at once'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--claim-timeout',
+            type=float,
+            default=600,
+            help='Seconds after which an unfinished claim is taken again'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty'
+        )
+        parser.add_argument(
+            '--requeue',
+            action='store_true',
+            help='Queue every recipe image again before starting'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            Recipe.objects.update(image_status=ImageStatus.PENDING)
+        executor = None
+        if options['processes'] > 1:
+            executor = ProcessPoolExecutor(options['processes'])
+        try:
+            while True:
+                close_old_connections()
+                claimed = self.claim(options['batch_size'],
+                                     options['claim_timeout'])
+                if claimed:
+                    self.process(claimed, executor)
+                    continue
+                if options['once']:
+                    break
+                sleep(options['interval'])
+        finally:
+            if executor:
+                executor.shutdown()
+
+    @staticmethod
+    def claim(batch_size, timeout):
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = list(Recipe.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                Q(image_status=ImageStatus.PENDING)
+                | Q(image_status=ImageStatus.PROCESSING,
+                    image_claimed_at__lt=now - timedelta(seconds=timeout))
+            ).values_list('id', 'image')[:batch_size])
+            Recipe.objects.filter(
+                id__in=[pk for pk, _ in claimed]
+            ).update(image_status=ImageStatus.PROCESSING,
+                     image_claimed_at=now)
+        return claimed
+
+    def process(self, claimed, executor):
+        names = [name for _, name in claimed]
+        results = (executor.map(try_render_renditions, names) if executor
+                   else map(try_render_renditions, names))
+        for (pk, name), renditions in zip(claimed, results):
+            status = ImageStatus.READY if renditions else ImageStatus.FAILED
+            if not Recipe.objects.filter(
+                pk=pk, image=name, image_status=ImageStatus.PROCESSING
+            ).update(image_status=status, image_renditions=renditions or {}):
+                delete_files(
+                    rendition['name']
+                    for title, rendition in (renditions or {}).items()
+                    if title not in ('original', 'placeholder')
+                )
+                self.stdout.write(f'Recipe {pk}: image replaced, skipped')
+                continue
+            self.stdout.write(f'Recipe {pk}: {status}')
+        recipes_version.invalidate()
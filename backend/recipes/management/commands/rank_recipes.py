@@ -0,0 +1,30 @@
+from time import sleep
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from recipes.models import RecipeScore
+from recipes.versions import recipes_version
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the popular and trending recipe scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Seconds between runs, the command exits after one run '
+                 'when it is 0'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            scored = RecipeScore.objects.rebuild()
+            recipes_version.invalidate()
+            self.stdout.write(f'Scored {scored} recipes')
+            if not options['interval']:
+                break
+            sleep(options['interval'])
@@ -0,0 +1,42 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.models import ShoppingList
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds or verifies the per-user shopping list aggregate'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare the aggregate with the carts, do not write'
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingList.objects.expected()
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingList.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        mismatched = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        self.stdout.write(
+            f'Rows expected: {len(expected)}, stored: {len(stored)}, '
+            f'mismatched: {len(mismatched)}'
+        )
+        if options['verify']:
+            if mismatched:
+                raise CommandError('Shopping list aggregate is out of sync')
+            return
+        created = ShoppingList.objects.rebuild()
+        self.stdout.write(f'Rebuilt {created} rows')
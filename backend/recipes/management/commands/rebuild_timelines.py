@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Fills or verifies the per-user subscription feed timelines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only count stale rows and incomplete recipes, do not write'
+        )
+
+    def handle(self, *args, **options):
+        authors = list(TimelineEntry.objects.authors())
+        if options['verify']:
+            stale = TimelineEntry.objects.stale().count()
+            incomplete = sum(
+                len(TimelineEntry.objects.gaps(author_id)[1])
+                for author_id in authors
+            )
+            self.stdout.write(
+                f'Stale rows: {stale}, incomplete recipes: {incomplete}'
+            )
+            if stale or incomplete:
+                raise CommandError('Timelines are out of sync')
+            return
+        with transaction.atomic():
+            deleted, _ = TimelineEntry.objects.stale().delete()
+            filled = sum(TimelineEntry.objects.fill(author_id)
+                         for author_id in authors)
+        self.stdout.write(
+            f'Removed {deleted} stale rows, filled {filled} recipes '
+            f'of {len(authors)} authors'
+        )
@@ -0,0 +1,28 @@
+from time import sleep
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from recipes.recommendations import rebuild_neighbors
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the similar recipes used for recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Seconds between runs, the command exits after one run '
+                 'when it is 0'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            stored = rebuild_neighbors()
+            self.stdout.write(f'Stored {stored} similar recipes')
+            if not options['interval']:
+                break
+            sleep(options['interval'])
@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.counters import drifted, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recounts or verifies the denormalized recipe and user counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only count the rows that drifted, do not write'
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatched = {
+                field: rows.count() for field, _, rows in drifted()
+            }
+            self.stdout.write(', '.join(
+                f'{field}: {count} mismatched'
+                for field, count in mismatched.items()
+            ))
+            if any(mismatched.values()):
+                raise CommandError('Counters are out of sync')
+            return
+        self.stdout.write(', '.join(
+            f'{field}: {count} fixed'
+            for field, count in reconcile().items()
+        ))
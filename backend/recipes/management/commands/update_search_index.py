@@ -0,0 +1,10 @@
+from django.core.management import BaseCommand
+
+from recipes.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of all recipes'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Recipes indexed: {rebuild_search_index()}')
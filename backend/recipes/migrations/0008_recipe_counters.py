@@ -0,0 +1,47 @@
+# Generated by Django 3.2.7 on 2026-10-18 01:48
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('recipes.Recipe', 'in_carts_count', 'recipes.ShoppingCart', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Follow', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model, field, counted, foreign_key in COUNTERS:
+        apps.get_model(model).objects.update(**{
+            field: Coalesce(models.Subquery(
+                apps.get_model(counted).objects.filter(
+                    **{foreign_key: models.OuterRef('pk')}
+                ).order_by().values(foreign_key).annotate(
+                    total=models.Count('pk')
+                ).values('total')
+            ), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_reverse_lookup_indexes'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
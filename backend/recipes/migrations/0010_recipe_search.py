@@ -0,0 +1,63 @@
+# Generated by Django 3.2.7 on 2026-10-18 02:07
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+CREATE_INDEX = {
+    'postgresql': (
+        'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+        'ON recipes_recipe USING gin (search_vector)',
+        "UPDATE recipes_recipe SET search_vector = "
+        "setweight(to_tsvector('russian', name), 'A') || "
+        "setweight(to_tsvector('russian', COALESCE(("
+        "SELECT string_agg(ingredient.name, ' ') "
+        "FROM recipes_ingredientinrecipe AS item "
+        "JOIN recipes_ingredient AS ingredient "
+        "ON ingredient.id = item.ingredient_id "
+        "WHERE item.recipe_id = recipes_recipe.id), '')), 'B') || "
+        "setweight(to_tsvector('russian', text), 'C')",
+    ),
+    'sqlite': (
+        'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+        'USING fts5(name, ingredients, text)',
+        "INSERT INTO recipes_recipe_fts (rowid, name, ingredients, text) "
+        "SELECT recipe.id, recipe.name, "
+        "COALESCE(GROUP_CONCAT(ingredient.name, ' '), ''), recipe.text "
+        "FROM recipes_recipe AS recipe "
+        "LEFT JOIN recipes_ingredientinrecipe AS item "
+        "ON item.recipe_id = recipe.id "
+        "LEFT JOIN recipes_ingredient AS ingredient "
+        "ON ingredient.id = item.ingredient_id "
+        "GROUP BY recipe.id",
+    ),
+}
+
+DROP_INDEX = {
+    'postgresql': ('DROP INDEX IF EXISTS recipe_search_vector_idx',),
+    'sqlite': ('DROP TABLE IF EXISTS recipes_recipe_fts',),
+}
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor,
+                                        ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.RunPython(run_for_vendor(CREATE_INDEX),
+                             run_for_vendor(DROP_INDEX)),
+    ]
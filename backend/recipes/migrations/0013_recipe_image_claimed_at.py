@@ -0,0 +1,18 @@
+# Generated by Django 3.2.7 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_claimed_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Взята в обработку'),
+        ),
+    ]
@@ -1,8 +1,16 @@
+from collections import defaultdict
+from datetime import timedelta
+
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (BooleanField, Case, Count, Exists, F,
+                              IntegerField, OuterRef, Prefetch, Q, Sum, Value,
+                              When)
+from django.utils import timezone
 
-from users.models import User
+from users.models import Follow, User
 
 LENGHT_TEXT = settings.MODELS_LENGHT_TEXT
 
@@ -55,6 +63,75 @@ class Ingredient(models.Model):
         return self.name
 
 
+class ImageStatus(models.TextChoices):
+    PENDING = 'pending', 'Ожидает обработки'
+    PROCESSING = 'processing', 'Обрабатывается'
+    READY = 'ready', 'Готова'
+    FAILED = 'failed', 'Ошибка'
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_data(self, user):
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+            queryset = self.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )
+        else:
+            authors = authors.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+            queryset = self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags',
+            Prefetch(
+                'ingredient_list',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name')
+            ),
+        )
+
+    @staticmethod
+    def user_state(user, recipe_ids, author_ids):
+        state = {'favorited': set(), 'in_cart': set(), 'subscribed': set()}
+        if not recipe_ids:
+            return state
+        rows = Favorite.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).annotate(
+            kind=Value('favorited', output_field=models.CharField())
+        ).values_list('kind', 'recipe_id').order_by().union(
+            ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).annotate(
+                kind=Value('in_cart', output_field=models.CharField())
+            ).values_list('kind', 'recipe_id').order_by(),
+            Follow.objects.filter(
+                user=user, author_id__in=author_ids
+            ).annotate(
+                kind=Value('subscribed', output_field=models.CharField())
+            ).values_list('kind', 'author_id').order_by(),
+            all=True
+        )
+        for kind, pk in rows:
+            state[kind].add(pk)
+        return state
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(
         Tag,
@@ -65,7 +142,8 @@ class Recipe(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
-        verbose_name='Автор рецепта'
+        verbose_name='Автор рецепта',
+        db_index=False
     )
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -81,6 +159,23 @@ class Recipe(models.Model):
         verbose_name='Картинка',
         upload_to='recipe/'
     )
+    image_status = models.CharField(
+        'Обработка картинки',
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.PENDING,
+        db_index=True
+    )
+    image_claimed_at = models.DateTimeField(
+        'Взята в обработку',
+        null=True,
+        editable=False
+    )
+    image_renditions = models.JSONField(
+        'Версии картинки',
+        default=dict,
+        blank=True
+    )
     text = models.TextField(
         'Описание',
     )
@@ -90,11 +185,36 @@ class Recipe(models.Model):
                     message='Минимальное время приготовления 1 минута')]
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.IntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.IntegerField(
+        'В корзинах',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый индекс',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('cooking_time', '-id'),
+                         name='recipe_cooking_time_id_idx'),
+        ]
 
     def __str__(self):
         return self.name[:30]
@@ -130,12 +250,19 @@ class BaseSelect(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        verbose_name='Пользователь'
+        verbose_name='Пользователь',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        verbose_name='Рецепт'
+        verbose_name='Рецепт',
+        db_index=False
+    )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True
     )
 
     class Meta:
@@ -143,6 +270,8 @@ class BaseSelect(models.Model):
         verbose_name_plural = 'Выбор рецептов'
         abstract = True
         ordering = ('user',)
+        indexes = [models.Index(fields=('recipe', 'user'),
+                                name='%(class)s_recipe_user_idx')]
 
     def __str__(self):
         return f'"{self.recipe}" добавил {self.user}'
@@ -169,3 +298,374 @@ class ShoppingCart(BaseSelect):
         verbose_name_plural = 'Корзина покупок'
         constraints = [models.UniqueConstraint(fields=['user', 'recipe'],
                        name='already_shopping_cart')]
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    @staticmethod
+    def recipe_amounts(recipes):
+        amounts = {}
+        for ingredient_id, amount in IngredientInRecipe.objects.filter(
+            recipe__in=recipes
+        ).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
+
+    @transaction.atomic
+    def change_amounts(self, user_ids, amounts):
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        self.bulk_create(
+            [self.model(user_id=user_id, ingredient_id=ingredient_id,
+                        amount=0)
+             for user_id in user_ids for ingredient_id in amounts],
+            ignore_conflicts=True
+        )
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=amounts)
+        rows.update(amount=F('amount') + Case(
+            *[When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()],
+            output_field=IntegerField()
+        ))
+        rows.filter(amount__lte=0).delete()
+
+    def add_recipe(self, user_ids, *recipes):
+        self.change_amounts(user_ids, self.recipe_amounts(recipes))
+
+    def remove_recipe(self, user_ids, *recipes):
+        self.change_amounts(user_ids, {
+            ingredient_id: -amount
+            for ingredient_id, amount in self.recipe_amounts(recipes).items()
+        })
+
+    def expected(self):
+        return IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values_list(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).order_by().annotate(total=Sum('amount'))
+
+    @transaction.atomic
+    def rebuild(self):
+        self.all().delete()
+        return len(self.bulk_create(
+            self.model(user_id=user_id, ingredient_id=ingredient_id,
+                       amount=amount)
+            for user_id, ingredient_id, amount in self.expected()
+        ))
+
+
+class ShoppingList(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество',
+        default=0
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'Списки покупок'
+        ordering = ('user',)
+        constraints = [models.UniqueConstraint(fields=['user', 'ingredient'],
+                       name='unique_shopping_list_ingredient')]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class RecipeScoreQuerySet(models.QuerySet):
+
+    @staticmethod
+    def compute(now):
+        popular_since = now - timedelta(days=settings.RECIPE_POPULAR_DAYS)
+        trending_since = now - timedelta(days=settings.RECIPE_TRENDING_DAYS)
+        half_life = timedelta(
+            hours=settings.RECIPE_TRENDING_HALF_LIFE_HOURS
+        ).total_seconds()
+        scores = defaultdict(lambda: [0, 0.0])
+        for model in (Favorite, ShoppingCart):
+            for recipe_id, created in model.objects.filter(
+                created__gte=min(popular_since, trending_since)
+            ).values_list('recipe_id', 'created').order_by().iterator():
+                score = scores[recipe_id]
+                if created >= popular_since:
+                    score[0] += 1
+                if created >= trending_since:
+                    age = max((now - created).total_seconds(), 0)
+                    score[1] += 0.5 ** (age / half_life)
+        return scores
+
+    @transaction.atomic
+    def rebuild(self, now=None):
+        scores = self.compute(now or timezone.now())
+        self.filter(Q(popular__gt=0) | Q(trending__gt=0)).update(
+            popular=0, trending=0
+        )
+        self.filter(recipe_id__in=scores).delete()
+        self.bulk_create(
+            (self.model(recipe_id=recipe_id, popular=popular,
+                        trending=trending)
+             for recipe_id, (popular, trending) in scores.items()),
+            batch_size=1000
+        )
+        self.bulk_create(
+            (self.model(recipe_id=recipe_id)
+             for recipe_id in Recipe.objects.filter(
+                 score__isnull=True
+            ).values_list('id', flat=True).iterator()),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        return len(scores)
+
+
+class RecipeScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт'
+    )
+    popular = models.IntegerField(
+        'Добавлений за неделю',
+        default=0
+    )
+    trending = models.FloatField(
+        'Тренд',
+        default=0
+    )
+
+    objects = RecipeScoreQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(fields=('-popular', '-recipe'),
+                         name='recipe_score_popular_idx'),
+            models.Index(fields=('-trending', '-recipe'),
+                         name='recipe_score_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe}: {self.popular}, {self.trending:.2f}'
+
+
+class RecipeNeighborQuerySet(models.QuerySet):
+
+    def recommended(self, user):
+        seeds = [
+            model.objects.filter(user=user).order_by('-created').values(
+                'recipe_id'
+            )[:settings.RECOMMENDATION_SEEDS]
+            for model in (Favorite, ShoppingCart)
+        ]
+        return self.filter(
+            Q(recipe_id__in=seeds[0]) | Q(recipe_id__in=seeds[1])
+        ).exclude(
+            neighbor_id__in=Favorite.objects.filter(
+                user=user
+            ).values('recipe_id')
+        ).exclude(
+            neighbor_id__in=ShoppingCart.objects.filter(
+                user=user
+            ).values('recipe_id')
+        ).exclude(
+            neighbor__author=user
+        ).values('neighbor_id').annotate(
+            score=Sum('similarity')
+        ).order_by('-score', '-neighbor_id').values_list('neighbor_id',
+                                                         flat=True)
+
+
+class RecipeNeighbor(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbors',
+        verbose_name='Рецепт',
+        db_index=False
+    )
+    neighbor = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    similarity = models.FloatField('Сходство')
+
+    objects = RecipeNeighborQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-similarity')
+        indexes = [
+            models.Index(fields=('recipe', '-similarity'),
+                         name='recipe_neighbor_similarity_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} -> {self.neighbor}: {self.similarity:.3f}'
+
+
+class TimelineQuerySet(models.QuerySet):
+
+    @staticmethod
+    def fans_out(author):
+        return author.followers_count <= settings.FEED_FANOUT_LIMIT
+
+    def entries(self, user_ids, recipes):
+        return (self.model(user_id=user_id, recipe_id=recipe_id,
+                           author_id=author_id, pub_date=pub_date)
+                for user_id in user_ids
+                for recipe_id, author_id, pub_date in recipes)
+
+    def fan_out(self, recipe):
+        if not self.fans_out(recipe.author):
+            return
+        self.bulk_create(
+            self.entries(
+                Follow.objects.filter(author_id=recipe.author_id).values_list(
+                    'user_id', flat=True
+                ).iterator(),
+                [(recipe.pk, recipe.author_id, recipe.pub_date)]
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def backfill(self, user_id, author):
+        if not self.fans_out(author):
+            return
+        self.bulk_create(
+            self.entries([user_id], Recipe.objects.filter(
+                author=author
+            ).order_by('-pub_date', '-id').values_list(
+                'id', 'author_id', 'pub_date'
+            )[:settings.FEED_BACKFILL_RECIPES]),
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def authors():
+        return Follow.objects.order_by().values('author_id').annotate(
+            total=Count('pk')
+        ).filter(total__lte=settings.FEED_FANOUT_LIMIT).values_list(
+            'author_id', flat=True
+        )
+
+    def stale(self):
+        return self.exclude(Exists(Follow.objects.filter(
+            user_id=OuterRef('user_id'), author_id=OuterRef('author_id')
+        )))
+
+    def gaps(self, author_id):
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        recipes = list(Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'author_id', 'pub_date'
+        )[:settings.FEED_BACKFILL_RECIPES])
+        counts = dict(self.filter(
+            recipe_id__in=[recipe_id for recipe_id, _, _ in recipes]
+        ).order_by().values('recipe_id').annotate(
+            total=Count('pk')
+        ).values_list('recipe_id', 'total'))
+        return followers, [
+            recipe for recipe in recipes
+            if counts.get(recipe[0], 0) < len(followers)
+        ]
+
+    def fill(self, author_id):
+        followers, recipes = self.gaps(author_id)
+        self.bulk_create(
+            self.entries(followers, recipes),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        return len(recipes)
+
+    def unfollowed(self, user, author_ids):
+        self.filter(user=user, author_id__in=author_ids).delete()
+        for author_id in User.objects.filter(
+            pk__in=author_ids,
+            followers_count=settings.FEED_FANOUT_LIMIT
+        ).values_list('pk', flat=True):
+            self.fill(author_id)
+
+    def sources(self, user):
+        pulled = list(Follow.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('author_id', flat=True))
+        return (
+            (self.filter(user=user).exclude(
+                author_id__in=pulled
+            ).values_list('pub_date', 'recipe_id'), 'pub_date', 'recipe_id'),
+            (Recipe.objects.filter(author_id__in=pulled).values_list(
+                'pub_date', 'id'
+            ), 'pub_date', 'id'),
+        )
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+        db_index=False
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+        db_index=False
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('user', '-pub_date')
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=('author', 'user'),
+                         name='timeline_author_user_idx'),
+        ]
+        constraints = [models.UniqueConstraint(fields=['user', 'recipe'],
+                       name='unique_timeline_recipe')]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
@@ -0,0 +1,284 @@
+import re
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import IngredientInRecipe, Recipe
+from .versions import SharedVersion
+
+BITMAP_DENSITY = 256
+CHANGE_LOG_TIMEOUT = 24 * 60 * 60
+NON_ZERO = re.compile(rb'[^\x00]')
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+def to_bitmap(recipe_ids):
+    if not recipe_ids:
+        return 0
+    data = bytearray(max(recipe_ids) // 8 + 1)
+    for recipe_id in recipe_ids:
+        data[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(data, 'little')
+
+
+def iter_desc(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'big')
+    last = len(data) - 1
+    for match in NON_ZERO.finditer(data):
+        byte, base = match.group()[0], (last - match.start()) * 8
+        for bit in range(7, -1, -1):
+            if byte >> bit & 1:
+                yield base + bit
+
+
+def add_to_slices(slices, bitmap):
+    carry = bitmap
+    for bit, value in enumerate(slices):
+        slices[bit], carry = value ^ carry, value & carry
+        if not carry:
+            return
+    slices.append(carry)
+
+
+def subtract_slices(minuend, subtrahend):
+    result, borrow = [], 0
+    for bit in range(max(len(minuend), len(subtrahend))):
+        a = minuend[bit] if bit < len(minuend) else 0
+        b = subtrahend[bit] if bit < len(subtrahend) else 0
+        result.append(a ^ b ^ borrow)
+        borrow = (~a & b) | (~(a ^ b) & borrow)
+    return result
+
+
+def equal_slices(slices, value, within):
+    if value >> len(slices):
+        return 0
+    for bit, bitmap in enumerate(slices):
+        within &= bitmap if value >> bit & 1 else ~bitmap
+    return within
+
+
+def compact(recipe_ids, top):
+    if len(recipe_ids) * BITMAP_DENSITY >= top:
+        return to_bitmap(recipe_ids)
+    return recipe_ids
+
+
+class Matches:
+
+    def __init__(self, levels):
+        self.levels = levels
+        self.counts = [popcount(level) for level in levels]
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        found = []
+        for level, count in zip(self.levels, self.counts):
+            if start < count and stop > 0:
+                found.extend(islice(iter_desc(level), start, stop))
+            start, stop = max(start - count, 0), stop - count
+        return found
+
+
+class PantrySnapshot:
+
+    def __init__(self, postings, sizes):
+        self.postings = postings
+        self.sizes = sizes
+
+    @classmethod
+    def read(cls):
+        top = Recipe.objects.aggregate(top=Max('id'))['top'] or 0
+        counts = array('H', [0]) * (top + 1)
+        postings = {}
+        current = None
+        for ingredient_id, recipe_id in IngredientInRecipe.objects.values_list(
+            'ingredient_id', 'recipe_id'
+        ).order_by('ingredient_id', 'recipe_id').iterator():
+            if ingredient_id != current:
+                current = ingredient_id
+                postings[current] = array('I')
+            elif postings[current][-1] == recipe_id:
+                continue
+            postings[current].append(recipe_id)
+            counts[recipe_id] += 1
+        sizes = [bytearray(top // 8 + 1)
+                 for _ in range(max(counts).bit_length())]
+        for recipe_id, count in enumerate(counts):
+            bit = 0
+            while count:
+                if count & 1:
+                    sizes[bit][recipe_id >> 3] |= 1 << (recipe_id & 7)
+                count >>= 1
+                bit += 1
+        return cls(
+            {ingredient_id: compact(recipe_ids, top)
+             for ingredient_id, recipe_ids in postings.items()},
+            [int.from_bytes(size, 'little') for size in sizes]
+        )
+
+    def apply(self, recipe_ids, ingredients):
+        recipe_ids = sorted(recipe_ids)
+        mask = to_bitmap(recipe_ids)
+        wanted = defaultdict(list)
+        for recipe_id in recipe_ids:
+            for ingredient_id in ingredients.get(recipe_id, ()):
+                wanted[ingredient_id].append(recipe_id)
+        postings = dict(self.postings)
+        for ingredient_id in postings.keys() | wanted.keys():
+            posting = postings.get(ingredient_id, array('I'))
+            present = wanted.get(ingredient_id, [])
+            if isinstance(posting, int):
+                postings[ingredient_id] = posting & ~mask | to_bitmap(present)
+                continue
+            kept = [recipe_id for recipe_id in recipe_ids
+                    if self.contains(posting, recipe_id)]
+            if kept == present:
+                continue
+            posting = array('I', posting)
+            for recipe_id in reversed(kept):
+                del posting[bisect_left(posting, recipe_id)]
+            for recipe_id in present:
+                posting.insert(bisect_left(posting, recipe_id), recipe_id)
+            postings[ingredient_id] = posting
+        sizes = list(self.sizes)
+        counts = {recipe_id: len(ingredients.get(recipe_id, ()))
+                  for recipe_id in recipe_ids}
+        width = max(counts.values(), default=0).bit_length()
+        sizes += [0] * (width - len(sizes))
+        for bit in range(len(sizes)):
+            sizes[bit] = sizes[bit] & ~mask | to_bitmap([
+                recipe_id for recipe_id, count in counts.items()
+                if count >> bit & 1
+            ])
+        return PantrySnapshot(postings, sizes)
+
+    @staticmethod
+    def contains(posting, recipe_id):
+        position = bisect_left(posting, recipe_id)
+        return position < len(posting) and posting[position] == recipe_id
+
+    def match(self, ingredient_ids, max_missing):
+        matched, candidates = [], 0
+        for ingredient_id in set(ingredient_ids):
+            posting = self.postings.get(ingredient_id)
+            if not posting:
+                continue
+            if not isinstance(posting, int):
+                posting = to_bitmap(posting)
+            candidates |= posting
+            add_to_slices(matched, posting)
+        missing = subtract_slices(self.sizes, matched)
+        return Matches([equal_slices(missing, count, candidates)
+                        for count in range(max_missing + 1)])
+
+
+def sql_matches(ingredient_ids, max_missing):
+    return Recipe.objects.annotate(
+        total=Count('ingredient_list__ingredient', distinct=True),
+        matched=Count(
+            'ingredient_list__ingredient',
+            filter=Q(ingredient_list__ingredient__in=ingredient_ids),
+            distinct=True
+        ),
+    ).filter(
+        matched__gt=0,
+        total__lte=F('matched') + max_missing
+    ).order_by(F('total') - F('matched'), '-id').values_list('id', flat=True)
+
+
+class PantryIndex:
+
+    def __init__(self, key):
+        self.shared = SharedVersion(f'{key}:version')
+        self.position_key = f'{key}:position'
+        self.change_key = f'{key}:change'
+        self.lock = Lock()
+        self.version = None
+        self.position = None
+        self.snapshot = None
+
+    def changed(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: self.log(recipe_ids))
+
+    def log(self, recipe_ids):
+        if self.shared.get() is None:
+            return
+        for _ in range(3):
+            if cache.add(self.position_key, 0, None):
+                self.shared.invalidate()
+            try:
+                position = cache.incr(self.position_key)
+            except ValueError:
+                continue
+            if cache.add(f'{self.change_key}:{position}', recipe_ids,
+                         CHANGE_LOG_TIMEOUT):
+                return
+        self.shared.invalidate()
+
+    def load(self):
+        version = self.shared.get()
+        if version is None:
+            return None
+        position = cache.get(self.position_key, 0)
+        if version == self.version and position == self.position:
+            return self.snapshot
+        with self.lock:
+            if version != self.version or position < self.position:
+                self.rebuild(version, position)
+            elif position > self.position:
+                self.update(version, position)
+        return self.snapshot
+
+    def rebuild(self, version, position):
+        self.snapshot = PantrySnapshot.read()
+        self.version, self.position = version, position
+
+    def update(self, version, position):
+        keys = [f'{self.change_key}:{number}'
+                for number in range(self.position + 1, position + 1)]
+        changes = {}
+        if len(keys) <= settings.PANTRY_INDEX_MAX_CHANGES:
+            changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self.rebuild(version, position)
+            return
+        recipe_ids = set().union(*changes.values())
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        self.snapshot = self.snapshot.apply(recipe_ids, ingredients)
+        self.position = position
+
+    def match(self, ingredient_ids, max_missing):
+        snapshot = self.load()
+        if snapshot is None:
+            return sql_matches(ingredient_ids, max_missing)
+        return snapshot.match(ingredient_ids, max_missing)
+
+
+pantry_index = PantryIndex('pantry')
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def log_recipe_ingredients(instance, **kwargs):
+    pantry_index.changed([instance.recipe_id])
@@ -0,0 +1,167 @@
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import (Favorite, IngredientInRecipe, Recipe, RecipeNeighbor,
+                     ShoppingCart)
+from users.models import Follow
+
+CANDIDATES_PER_NEIGHBOR = 10
+
+
+def columns(queryset, *fields):
+    values = np.fromiter(
+        chain.from_iterable(
+            queryset.order_by().values_list(*fields).iterator()
+        ),
+        dtype=np.int64
+    )
+    return values.reshape(-1, len(fields)).T
+
+
+def incidence(rows, cols, shape):
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=shape
+    )
+    matrix.data[:] = 1
+    return matrix
+
+
+def normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def rowwise_dot(matrix, rows, cols):
+    return np.asarray(
+        matrix[rows].multiply(matrix[cols]).sum(axis=1)
+    ).ravel()
+
+
+def top_in_rows(matrix, limit):
+    rows, cols, scores = [], [], []
+    for row in range(matrix.shape[0]):
+        begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+        data = matrix.data[begin:end]
+        best = (np.argpartition(-data, limit - 1)[:limit]
+                if len(data) > limit else np.arange(len(data)))
+        rows.append(np.full(len(best), row))
+        cols.append(matrix.indices[begin:end][best])
+        scores.append(data[best])
+    if not rows:
+        return np.array([], int), np.array([], int), np.array([])
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
+
+
+class SimilarityModel:
+
+    def __init__(self):
+        recipe_ids, author_ids = columns(Recipe.objects, 'id', 'author_id')
+        order = np.argsort(recipe_ids)
+        self.recipe_ids, author_ids = recipe_ids[order], author_ids[order]
+        count = len(self.recipe_ids)
+        self.matrices = {
+            'favorites': self.favorites(count),
+            'follows': self.follows(author_ids),
+            'ingredients': self.ingredients(count),
+            'tags': self.tags(count),
+        }
+        self.rare_ingredients = self.matrices['ingredients'].dot(
+            sparse.diags(self.rare)
+        ).tocsr()
+
+    @staticmethod
+    def positions(keys, ids):
+        positions = np.searchsorted(keys, ids)
+        positions[positions == len(keys)] = 0
+        known = keys[positions] == ids if len(keys) else positions < 0
+        return positions[known], known
+
+    def related(self, count, recipe_ids, other_ids):
+        positions, known = self.positions(self.recipe_ids, recipe_ids)
+        others, other_index = np.unique(other_ids[known],
+                                        return_inverse=True)
+        return incidence(positions, other_index, (count, len(others)))
+
+    def favorites(self, count):
+        user_ids, recipe_ids = np.hstack([
+            columns(model.objects, 'user_id', 'recipe_id')
+            for model in (Favorite, ShoppingCart)
+        ])
+        return normalize(self.related(count, recipe_ids, user_ids))
+
+    def follows(self, author_ids):
+        authors, author_index = np.unique(author_ids, return_inverse=True)
+        user_ids, followed_ids = columns(Follow.objects, 'user_id',
+                                         'author_id')
+        positions, known = self.positions(authors, followed_ids)
+        users, user_index = np.unique(user_ids[known], return_inverse=True)
+        followers = normalize(incidence(positions, user_index,
+                                        (len(authors), len(users))))
+        return followers[author_index]
+
+    def ingredients(self, count):
+        matrix = self.related(count, *columns(
+            IngredientInRecipe.objects, 'recipe_id', 'ingredient_id'
+        ))
+        frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+        self.rare = (
+            frequency <= settings.RECOMMENDATION_MAX_INGREDIENT_SHARE * count
+        ).astype(float)
+        idf = np.log(count / np.maximum(frequency, 1))
+        return normalize(matrix.dot(sparse.diags(idf)))
+
+    def tags(self, count):
+        return normalize(self.related(count, *columns(
+            Recipe.tags.through.objects, 'recipe_id', 'tag_id'
+        )))
+
+    def candidates(self, start, stop):
+        favorites = self.matrices['favorites']
+        ingredients = self.rare_ingredients
+        rows, cols, _ = top_in_rows(
+            favorites[start:stop].dot(favorites.T).tocsr()
+            + ingredients[start:stop].dot(ingredients.T).tocsr(),
+            settings.RECOMMENDATION_NEIGHBORS * CANDIDATES_PER_NEIGHBOR + 1
+        )
+        other = rows + start != cols
+        return rows[other], cols[other]
+
+    def score(self, rows, cols):
+        return sum(
+            weight * rowwise_dot(self.matrices[name], rows, cols)
+            for name, weight in settings.RECOMMENDATION_WEIGHTS.items()
+        )
+
+    def neighbors(self, chunk_size=1000):
+        count = len(self.recipe_ids)
+        for start in range(0, count, chunk_size):
+            stop = min(start + chunk_size, count)
+            rows, cols = self.candidates(start, stop)
+            rows, cols, scores = top_in_rows(sparse.csr_matrix(
+                (self.score(rows + start, cols), (rows, cols)),
+                shape=(stop - start, count)
+            ), settings.RECOMMENDATION_NEIGHBORS)
+            yield (self.recipe_ids[rows + start], self.recipe_ids[cols],
+                   scores)
+
+
+@transaction.atomic
+def rebuild_neighbors(batch_size=5000):
+    neighbors = SimilarityModel().neighbors()
+    RecipeNeighbor.objects.all().delete()
+    stored = 0
+    for recipe_ids, neighbor_ids, scores in neighbors:
+        stored += len(RecipeNeighbor.objects.bulk_create(
+            (RecipeNeighbor(recipe_id=recipe_id, neighbor_id=neighbor_id,
+                            similarity=score)
+             for recipe_id, neighbor_id, score in zip(
+                 recipe_ids.tolist(), neighbor_ids.tolist(), scores.tolist()
+            )),
+            batch_size=batch_size
+        ))
+    return stored
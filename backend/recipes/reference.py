@@ -0,0 +1,117 @@
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Ingredient, Tag
+from .versions import SharedVersion
+
+
+class Snapshot:
+
+    def __init__(self, objects, search_field):
+        self.objects = objects
+        self.by_pk = {obj.pk: obj for obj in objects}
+        self.sorted = sorted(
+            objects, key=lambda obj: getattr(obj, search_field).casefold()
+        ) if search_field else []
+        self.keys = [
+            getattr(obj, search_field).casefold() for obj in self.sorted
+        ]
+
+
+class ReferenceData:
+
+    def __init__(self, model, fields, search_field=None):
+        self.model = model
+        self.fields = ('id',) + fields
+        self.search_field = search_field
+        self.shared = SharedVersion(f'reference:{model._meta.label_lower}')
+        self.lock = Lock()
+        self.version = None
+        self.snapshot = None
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def invalidate(self):
+        self.shared.invalidate()
+
+    def load(self):
+        version = self.shared.get()
+        if version is None:
+            return None
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.snapshot = self.read()
+                    self.version = version
+        return self.snapshot
+
+    def read(self):
+        limit = settings.REFERENCE_CACHE_MAX_ROWS
+        queryset = self.model.objects.all()
+        rows = list(queryset.values_list(*self.fields)[:limit + 1])
+        if len(rows) > limit:
+            return None
+        return Snapshot(
+            [self.model.from_db(queryset.db, self.fields, row)
+             for row in rows],
+            self.search_field
+        )
+
+    def all(self):
+        snapshot = self.load()
+        return None if snapshot is None else snapshot.objects
+
+    def get(self, pk):
+        snapshot = self.load()
+        if snapshot is None:
+            return self.model.objects.filter(pk=pk).first()
+        return snapshot.by_pk.get(pk)
+
+    def in_bulk(self, pks):
+        snapshot = self.load()
+        if snapshot is None:
+            return self.model.objects.in_bulk(pks)
+        return {pk: snapshot.by_pk[pk] for pk in pks if pk in snapshot.by_pk}
+
+    def search(self, text, limit=None, substrings=True):
+        snapshot = self.load()
+        if snapshot is None:
+            return None
+        text = text.casefold()
+        keys, objects = snapshot.keys, snapshot.sorted
+        found = []
+        position = bisect_left(keys, text)
+        while (position < len(keys) and keys[position].startswith(text)
+               and len(found) != limit):
+            found.append(objects[position])
+            position += 1
+        if substrings and (limit is None or len(found) < limit):
+            for key, obj in zip(keys, objects):
+                if text in key and not key.startswith(text):
+                    found.append(obj)
+                    if len(found) == limit:
+                        break
+        return found
+
+
+cached_tags = ReferenceData(Tag, ('name', 'color', 'slug'))
+cached_ingredients = ReferenceData(
+    Ingredient, ('name', 'measurement_unit'), search_field='name'
+)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    cached_tags.shared.invalidate_on_commit()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    cached_ingredients.shared.invalidate_on_commit()
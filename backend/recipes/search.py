@@ -0,0 +1,149 @@
+import re
+from html import escape
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery,
+                                            SearchRank, SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Subquery, TextField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import IngredientInRecipe, Recipe
+
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_WEIGHTS = (1.0, 0.4, 0.2)
+HIGHLIGHT = ('\ue000', '\ue001')
+MARKUP = ('<b>', '</b>')
+SNIPPET_WORDS = 24
+BATCH_SIZE = 500
+
+
+def ingredient_names():
+    return Subquery(
+        IngredientInRecipe.objects.filter(
+            recipe_id=OuterRef('pk')
+        ).order_by().values('recipe_id').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names'),
+        output_field=TextField()
+    )
+
+
+def search_vector():
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (SearchVector('name', weight='A', config=config)
+            + SearchVector(ingredient_names(), weight='B', config=config)
+            + SearchVector('text', weight='C', config=config))
+
+
+def update_search_index(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=search_vector()
+        )
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT recipe.id, recipe.name, '
+            f'COALESCE(GROUP_CONCAT(ingredient.name, \' \'), \'\'), '
+            f'recipe.text '
+            f'FROM recipes_recipe AS recipe '
+            f'LEFT JOIN recipes_ingredientinrecipe AS item '
+            f'ON item.recipe_id = recipe.id '
+            f'LEFT JOIN recipes_ingredient AS ingredient '
+            f'ON ingredient.id = item.ingredient_id '
+            f'WHERE recipe.id IN ({placeholders}) GROUP BY recipe.id',
+            recipe_ids
+        )
+
+
+def rebuild_search_index():
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        update_search_index(recipe_ids[start:start + BATCH_SIZE])
+    return len(recipe_ids)
+
+
+def highlight_markup(value):
+    value = escape(value)
+    for marker, tag in zip(HIGHLIGHT, MARKUP):
+        value = value.replace(marker, tag)
+    return value
+
+
+def search(queryset, value):
+    if connection.vendor == 'postgresql':
+        return postgresql_search(queryset, value)
+    return sqlite_search(queryset, value)
+
+
+def postgresql_search(queryset, value):
+    config = settings.RECIPE_SEARCH_CONFIG
+    start_sel, stop_sel = HIGHLIGHT
+    query = SearchQuery(value, config=config, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query),
+        search_name=SearchHeadline(
+            'name', query, config=config, start_sel=start_sel,
+            stop_sel=stop_sel, highlight_all=True
+        ),
+        search_text=SearchHeadline(
+            'text', query, config=config, start_sel=start_sel,
+            stop_sel=stop_sel, max_words=SNIPPET_WORDS,
+            min_words=SNIPPET_WORDS // 2
+        ),
+    ).order_by('-search_rank', '-id')
+
+
+def sqlite_match(value):
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', value))
+
+
+def sqlite_search(queryset, value):
+    match = sqlite_match(value)
+    if not match:
+        return queryset.none()
+    start_sel, stop_sel = HIGHLIGHT
+    weights = ', '.join(map(str, FTS_WEIGHTS))
+
+    def matched(column):
+        return (f'SELECT {column} FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'AND rowid = {Recipe._meta.db_table}.id')
+
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,)
+    )).annotate(
+        search_rank=RawSQL(matched(f'-bm25({FTS_TABLE}, {weights})'),
+                           (match,), output_field=FloatField()),
+        search_name=RawSQL(
+            matched(f'highlight({FTS_TABLE}, 0, %s, %s)'),
+            (start_sel, stop_sel, match), output_field=TextField()
+        ),
+        search_text=RawSQL(
+            matched(f'snippet({FTS_TABLE}, 2, %s, %s, %s, {SNIPPET_WORDS})'),
+            (start_sel, stop_sel, '…', match), output_field=TextField()
+        ),
+    ).order_by('-search_rank', '-id')
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_search_row(instance, **kwargs):
+    if connection.vendor == 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [instance.pk])
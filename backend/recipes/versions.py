@@ -0,0 +1,50 @@
+from time import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Recipe
+from users.models import User
+
+
+class SharedVersion:
+
+    def __init__(self, key):
+        self.key = key
+
+    def get(self):
+        version = cache.get(self.key)
+        if version is not None:
+            return version
+        cache.add(self.key, repr(time()), None)
+        return cache.get(self.key)
+
+    def invalidate(self):
+        cache.set(self.key, repr(time()), None)
+
+    def invalidate_on_commit(self):
+        transaction.on_commit(self.invalidate)
+
+
+def user_version(user_id):
+    return SharedVersion(f'version:user:{user_id}')
+
+
+recipes_version = SharedVersion('version:recipes')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipes(**kwargs):
+    recipes_version.invalidate_on_commit()
+
+
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_authors(update_fields=None, **kwargs):
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        recipes_version.invalidate_on_commit()
@@ -8,21 +8,13 @@ from .models import Follow, User
 class UserAdmin(UserAdmin):
     list_display = (
         'id', 'username', 'email', 'first_name', 'last_name',
-        'recipes_count', 'follower_count', 'following_count'
+        'recipes_count', 'followers_count', 'following_count'
     )
     list_filter = ('email', 'first_name',)
 
-    @admin.display(description='Кол-во рецептов')
-    def recipes_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description='Кол-во подписчиков')
-    def follower_count(self, obj):
-        return obj.follower.count()
-
     @admin.display(description='Кол-во подписок')
     def following_count(self, obj):
-        return obj.following.count()
+        return obj.follower.count()
 
 
 class FollowAdmin(admin.ModelAdmin):
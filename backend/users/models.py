@@ -25,6 +25,16 @@ class User(AbstractUser):
         'Фамилия',
         max_length=LENGHT_USER
     )
+    recipes_count = models.IntegerField(
+        'Кол-во рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.IntegerField(
+        'Кол-во подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
@@ -47,18 +57,22 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
-        verbose_name='Подписка'
+        verbose_name='Подписка',
+        db_index=False
     )
 
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [models.Index(fields=('author', 'user'),
+                                name='follow_author_user_idx')]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'], name='already_following'